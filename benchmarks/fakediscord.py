@@ -0,0 +1,383 @@
+"""A local stand-in for Discord's REST API and gateway
+
+Runs an aiohttp server on its own thread and event loop, so its cost stays
+off the bot's loop. Only what the bot needs to log in, receive events and
+reply is implemented, other routes answer an empty JSON object."""
+
+import asyncio
+import itertools
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import discord
+import discord.gateway
+import discord.http
+import yarl
+from aiohttp import WSMsgType, web
+
+BOT_ID = 1000
+APPLICATION_ID = BOT_ID
+GUILD_ID = 2000
+CHANNEL_ID = 3000
+EVERYONE = "8"  # Administrator, so permission checks always pass
+TIMESTAMP = "2024-01-01T00:00:00+00:00"
+
+_snowflakes = itertools.count(int(time.time() * 1000 - 1420070400000) << 22)
+
+
+def snowflake() -> str:
+    return str(next(_snowflakes))
+
+
+def user(id: int, name: str, bot: bool = False) -> Dict[str, Any]:
+    return {
+        "id": str(id),
+        "username": name,
+        "global_name": name,
+        "discriminator": "0",
+        "avatar": None,
+        "bot": bot,
+    }
+
+
+def member(user: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "user": user,
+        "roles": [],
+        "joined_at": TIMESTAMP,
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def channel(id: int = CHANNEL_ID, guild_id: int = GUILD_ID) -> Dict[str, Any]:
+    return {
+        "id": str(id),
+        "guild_id": str(guild_id),
+        "type": 0,
+        "name": "general",
+        "position": 0,
+        "permission_overwrites": [],
+        "nsfw": False,
+    }
+
+
+def guild(users: List[Dict[str, Any]], id: int = GUILD_ID) -> Dict[str, Any]:
+    members = [member(u) for u in users]
+    return {
+        "id": str(id),
+        "name": "Load test",
+        "icon": None,
+        "owner_id": users[0]["id"],
+        "roles": [
+            {
+                "id": str(id),
+                "name": "@everyone",
+                "permissions": EVERYONE,
+                "position": 0,
+                "color": 0,
+                "hoist": False,
+                "managed": False,
+                "mentionable": False,
+                "flags": 0,
+            }
+        ],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "member_count": len(members),
+        "members": members,
+        "channels": [channel(guild_id=id)],
+        "threads": [],
+        "presences": [],
+        "voice_states": [],
+        "stage_instances": [],
+        "guild_scheduled_events": [],
+        "soundboard_sounds": [],
+        "large": False,
+        "unavailable": False,
+        "joined_at": TIMESTAMP,
+        "afk_channel_id": None,
+        "afk_timeout": 300,
+        "mfa_level": 0,
+        "verification_level": 0,
+        "explicit_content_filter": 0,
+        "default_message_notifications": 0,
+        "system_channel_flags": 0,
+        "premium_tier": 0,
+        "preferred_locale": "en-US",
+        "nsfw_level": 0,
+        "premium_progress_bar_enabled": False,
+    }
+
+
+def message(
+    author: Dict[str, Any],
+    content: str,
+    channel_id: int = CHANNEL_ID,
+    guild_id: Optional[int] = GUILD_ID,
+    **fields: Any,
+) -> Dict[str, Any]:
+    data = {
+        "id": snowflake(),
+        "channel_id": str(channel_id),
+        "author": author,
+        "content": content,
+        "timestamp": TIMESTAMP,
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "components": [],
+        "pinned": False,
+        "type": 0,
+        **fields,
+    }
+    if guild_id is not None:
+        data["guild_id"] = str(guild_id)
+        data["member"] = {k: v for k, v in member(author).items() if k != "user"}
+    return data
+
+
+def interaction(
+    author: Dict[str, Any], name: str, options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """A slash command invocation, string options only"""
+    return {
+        "id": snowflake(),
+        "application_id": str(APPLICATION_ID),
+        "type": 2,
+        "token": "token-" + snowflake(),
+        "version": 1,
+        "guild_id": str(GUILD_ID),
+        "channel_id": str(CHANNEL_ID),
+        "channel": channel(),
+        "member": {**member(author), "permissions": EVERYONE},
+        "data": {
+            "id": snowflake(),
+            "name": name,
+            "type": 1,
+            "options": [{"name": k, "type": 3, "value": v} for k, v in options.items()],
+        },
+        "locale": "en-US",
+        "guild_locale": "en-US",
+        "app_permissions": EVERYONE,
+        "entitlements": [],
+        "authorizing_integration_owners": {},
+        "context": 0,
+        "attachment_size_limit": 25 * 1024**2,
+    }
+
+
+def _json(data: Any, status: int = 200) -> web.Response:
+    # discord.py only decodes an exact application/json content type
+    return web.Response(
+        body=json.dumps(data).encode(),
+        status=status,
+        headers={"Content-Type": "application/json"},
+    )
+
+
+class FakeDiscord:
+    """REST and gateway on 127.0.0.1, `patch()` points discord.py at it"""
+
+    def __init__(
+        self,
+        users: List[Dict[str, Any]],
+        bot: Optional[Dict[str, Any]] = None,
+        application_id: int = APPLICATION_ID,
+    ) -> None:
+        self.bot = bot or user(BOT_ID, "AceBot", bot=True)
+        self.application_id = application_id
+        self.users = users
+        # Raw payloads sent after IDENTIFY instead of a synthetic READY
+        self.startup: Optional[List[str]] = None
+        self.requests: Dict[str, int] = {}  # route -> count
+
+        self.loop = asyncio.new_event_loop()
+        self.port: int = 0
+        self._sockets: List[web.WebSocketResponse] = []
+        self._sequence = itertools.count(1)
+        self._ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="fakediscord", daemon=True
+        )
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> None:
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+    def patch(self) -> None:
+        discord.http.Route.BASE = f"{self.base}/api/v10"
+        discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(
+            f"ws://127.0.0.1:{self.port}/gateway"
+        )
+
+    def run(self, coro) -> "asyncio.Future":
+        """Runs a coroutine on the server's loop, awaitable from another loop"""
+        return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    async def dispatch(self, event: str, data: Any) -> None:
+        """Sends a gateway dispatch to every connected shard, call on the server loop"""
+        await self.send(
+            json.dumps({"op": 0, "t": event, "s": next(self._sequence), "d": data})
+        )
+
+    async def send(self, payload: str) -> None:
+        """Sends a raw gateway payload as is, call on the server loop"""
+        for ws in self._sockets:
+            await ws.send_str(payload)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        app = web.Application(client_max_size=32 * 1024**2)
+        app.router.add_get("/gateway", self._gateway)
+        app.router.add_route("*", "/api/v10/{path:.*}", self._rest)
+        self._runner = runner = web.AppRunner(app, access_log=None)
+        self.loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        await ws.send_json({"op": 10, "d": {"heartbeat_interval": 41250}})
+
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            payload = json.loads(msg.data)
+            op = payload["op"]
+            if op == 1:  # Heartbeat
+                await ws.send_json({"op": 11})
+            elif op == 2:  # Identify
+                self._sockets.append(ws)
+                if self.startup is not None:
+                    for raw in self.startup:
+                        await ws.send_str(raw)
+                    continue
+                await self.dispatch("READY", self._ready_payload())
+                await self.dispatch("GUILD_CREATE", guild([self.bot, *self.users]))
+            elif op == 8:  # Request guild members
+                await self.dispatch(
+                    "GUILD_MEMBERS_CHUNK",
+                    {
+                        "guild_id": payload["d"]["guild_id"],
+                        "members": [member(u) for u in [self.bot, *self.users]],
+                        "chunk_index": 0,
+                        "chunk_count": 1,
+                        "nonce": payload["d"].get("nonce"),
+                    },
+                )
+
+        if ws in self._sockets:
+            self._sockets.remove(ws)
+        return ws
+
+    def _ready_payload(self) -> Dict[str, Any]:
+        return {
+            "v": 10,
+            "user": self.bot,
+            "guilds": [{"id": str(GUILD_ID), "unavailable": True}],
+            "session_id": "fake",
+            "resume_gateway_url": f"ws://127.0.0.1:{self.port}/gateway",
+            "application": {"id": str(self.application_id), "flags": 0},
+            "private_channels": [],
+            "relationships": [],
+        }
+
+    async def _rest(self, request: web.Request) -> web.StreamResponse:
+        path = request.match_info["path"]
+        parts = path.split("/")
+        # Templated like discord.py route keys, ids collapsed
+        route = f"{request.method} /" + "/".join(
+            "{id}" if p.isdigit() else p for p in parts
+        )
+        self.requests[route] = self.requests.get(route, 0) + 1
+
+        if path == "users/@me":
+            return _json(self.bot)
+        if path == "oauth2/applications/@me":
+            return _json(self._application())
+        if path in ("gateway", "gateway/bot"):
+            return _json(
+                {
+                    "url": f"ws://127.0.0.1:{self.port}/gateway",
+                    "shards": 1,
+                    "session_start_limit": {
+                        "total": 1000,
+                        "remaining": 1000,
+                        "reset_after": 0,
+                        "max_concurrency": 1,
+                    },
+                }
+            )
+
+        if parts[0] == "interactions" and parts[-1] == "callback":
+            body = await self._body(request)
+            return _json(
+                {
+                    "interaction": {"id": parts[1], "type": 2},
+                    "resource": {
+                        "type": body.get("type", 4),
+                        "message": self._message(parts, body),
+                    },
+                }
+            )
+
+        if request.method == "DELETE" or parts[-1] == "typing" or "reactions" in parts:
+            return web.Response(status=204)
+
+        if "messages" in parts or parts[0] == "webhooks":
+            return _json(self._message(parts, await self._body(request)))
+
+        return _json({})
+
+    async def _body(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        if request.content_type.startswith("multipart/"):
+            async for part in await request.multipart():
+                if part.name == "payload_json":
+                    return json.loads(await part.text())
+        return {}
+
+    def _message(self, parts: List[str], body: Dict[str, Any]) -> Dict[str, Any]:
+        data = body.get("data", body)  # Interaction callbacks nest it
+        return message(
+            self.bot,
+            data.get("content") or "",
+            embeds=data.get("embeds") or [],
+            components=data.get("components") or [],
+        )
+
+    def _application(self) -> Dict[str, Any]:
+        return {
+            "id": str(self.application_id),
+            "name": self.bot["username"],
+            "icon": None,
+            "description": "",
+            "bot_public": True,
+            "bot_require_code_grant": False,
+            "owner": self.users[0],
+            "verify_key": "",
+            "flags": 0,
+        }
@@ -0,0 +1,131 @@
+"""objects.inv decoding time and memory, dict entries vs ext.rtfm.Inventory
+
+Usage: python -m benchmarks.inventory_memory [--scale 1]
+
+`--scale` repeats the bundled inventories' entries under new names, to see
+how decoding grows with real-sized inventories."""
+
+import argparse
+import gc
+import re
+import time
+import tracemalloc
+import zlib
+from typing import Callable, Dict, Generator, List, Tuple
+
+from benchmarks.micro import OBJECTS_INV, PYTHON_INV
+from ext import rtfm
+
+
+class LegacyReader(rtfm.SphinxObjectFileReader):
+    def read_compressed_lines(self) -> Generator[str, None, None]:
+        # Re-slices the rest of the buffer after every line
+        buffer = b""
+        for chunk in self.read_compressed_chunks():
+            buffer += chunk
+            position = buffer.find(b"\n")
+            while position != -1:
+                yield buffer[:position].decode()
+                buffer = buffer[position + 1 :]
+                position = buffer.find(b"\n")
+
+
+def legacy_parse(data: bytes, url: str) -> Dict[str, Dict[str, str]]:
+    # A dict with a full url per entry, what parse_object_inv used to build
+    stream = LegacyReader(data)
+    result: Dict[str, Dict[str, str]] = {}
+    stream.readline()
+    projname = stream.readline().rstrip()[11:]
+    stream.readline()
+    stream.readline()
+    entry_regex = re.compile(r"(?x)(.+?)\s+(\S*:\S*)\s+(-?\d+)\s+(\S+)\s+(.*)")
+    for line in stream.read_compressed_lines():
+        match = entry_regex.match(line.rstrip())
+        if not match:
+            continue
+        name, directive, _, location, dispname = match.groups()
+        domain, _, subdirective = directive.partition(":")
+        if directive == "py:module" and name in result:
+            continue
+        if directive == "std:doc":
+            subdirective = "label"
+        if location.endswith("$"):
+            location = location[:-1] + name
+        key = name if dispname == "-" else dispname
+        prefix = f"{subdirective}:" if domain == "std" else ""
+        if projname == "discord.py":
+            key = key.replace("discord.ext.commands.", "").replace("discord.", "")
+        result[f"{prefix}{key}"] = {
+            "url": "/".join((url, location)),
+            "type": directive.split(":")[1],
+        }
+    return result
+
+
+def compact_parse(data: bytes, url: str) -> rtfm.Inventory:
+    return rtfm.parse_object_inv(rtfm.SphinxObjectFileReader(data), url)
+
+
+def scaled(data: bytes, scale: int) -> bytes:
+    """The inventory with its entries repeated `scale` times under new names"""
+    if scale == 1:
+        return data
+    header, _, _ = data.partition(b"zlib.\n")
+    body = zlib.decompress(data[len(header) + 6 :])
+    lines = body.splitlines(keepends=True)
+    copies = [
+        b"".join(b"copy%d." % i + line if i else line for line in lines)
+        for i in range(scale)
+    ]
+    return header + b"zlib.\n" + zlib.compress(b"".join(copies))
+
+
+def measure(
+    parse: Callable[[bytes, str], object], data: bytes, url: str
+) -> Tuple[float, float, float]:
+    """Seconds, peak and retained MB of one parse"""
+    gc.collect()
+    start = time.perf_counter()
+    parse(data, url)
+    elapsed = time.perf_counter() - start
+
+    # Traced apart, tracemalloc slows allocations down several times
+    gc.collect()
+    tracemalloc.start()
+    inventory = parse(data, url)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del inventory
+    return elapsed, peak / 1024**2, retained / 1024**2
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    sources = [
+        ("discord.py", OBJECTS_INV, rtfm.RTFM_PAGES["stable"]),
+        ("python", PYTHON_INV, rtfm.RTFM_PAGES["python"]),
+    ]
+    for name, path, url in sources:
+        data = scaled(path.read_bytes(), args.scale)
+        entries = len(compact_parse(data, url))
+        print(f"{name}: {entries:,} entries, {len(data) / 1024:,.0f} KB compressed")
+        baseline = None
+        for label, parse in (
+            ("dict entries", legacy_parse),
+            ("Inventory", compact_parse),
+        ):
+            elapsed, peak, retained = measure(parse, data, url)
+            baseline = baseline or (elapsed, peak, retained)
+            print(
+                f"  {label:<13} {elapsed * 1000:>9,.1f} ms  x{elapsed / baseline[0]:.2f}"
+                f"  peak {peak:>7,.2f} MB x{peak / baseline[1]:.2f}"
+                f"  retained {retained:>7,.2f} MB x{retained / baseline[2]:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
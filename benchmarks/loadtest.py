@@ -0,0 +1,312 @@
+"""Drives AceBot with synthetic commands through a fake Discord
+
+Usage: python -m benchmarks.loadtest [--rate 50] [--duration 10] [--mix rtfm=2,balance=1]
+                                     [--interactions 0.3] [-o results.json]
+                                     [--record gateway.jsonl.gz]
+
+Every command in the mix runs as its own scenario, then all of them mixed.
+Latency is from the gateway send to on_command_completion/on_command_error."""
+
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks import fakediscord
+from benchmarks.micro import OBJECTS_INV
+
+# Prefix invocations and, for hybrid commands, slash options
+COMMANDS: Dict[str, Tuple[List[str], Optional[Dict[str, str]]]] = {
+    "help": (["help", "help rtfm", "help info"], {"entity": "rtfm"}),
+    "rtfm": (
+        [
+            "rtfm stable Client.fetch_user",
+            "rtfm stable Embed",
+            "rtfm stable attr:Member.roles",
+        ],
+        {"source": "stable", "obj": "Client.fetch_user"},
+    ),
+    "cwiki": (["cwiki France", "cwiki jp", "cwiki Brazil"], {"country": "France"}),
+    "balance": (["balance"], None),
+    "info": (["info"], {}),
+    # Messages that are not commands, still parsed by process_commands
+    "chatter": (["hello there", "does anyone know how to use cogs?"], None),
+}
+PREFIX = "!"
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(p / 100 * len(values)), len(values) - 1)]
+
+
+@dataclass
+class Scenario:
+    name: str
+    mix: Dict[str, float]
+    sent: int = 0
+    commands: int = 0  # Sent events that invoke a command
+    completed: int = 0
+    errors: int = 0
+    failures: Dict[str, int] = field(default_factory=dict)  # Error type -> count
+    requests: int = 0  # REST calls received by the fake
+    duration: float = 0.0
+    latencies: List[float] = field(default_factory=list)  # ms
+    lags: List[float] = field(default_factory=list)  # ms
+
+    def report(self) -> Dict[str, Any]:
+        done = self.completed + self.errors
+        return {
+            "mix": self.mix,
+            "sent": self.sent,
+            "completed": self.completed,
+            "errors": self.errors,
+            "failures": self.failures,
+            "lost": self.commands - done,
+            "throughput": done / self.duration if self.duration else 0.0,
+            "rest_requests": self.requests,
+            "latency_ms": {f"p{p}": percentile(self.latencies, p) for p in (50, 95, 99)}
+            | {"max": max(self.latencies, default=0.0)},
+            "loop_lag_ms": {f"p{p}": percentile(self.lags, p) for p in (50, 99)}
+            | {"max": max(self.lags, default=0.0)},
+        }
+
+
+class LoadTest:
+    def __init__(
+        self, bot, fake: fakediscord.FakeDiscord, args: argparse.Namespace
+    ) -> None:
+        self.bot = bot
+        self.fake = fake
+        self.args = args
+        self.rng = random.Random(0)
+        # Message or interaction id -> (scenario, sent at)
+        self.pending: Dict[int, Tuple[Scenario, float]] = {}
+
+        bot.add_listener(self.on_command_completion)
+        bot.add_listener(self.on_command_error)
+
+    def _done(self, ctx, error: Optional[Exception] = None) -> None:
+        key = ctx.interaction.id if ctx.interaction else ctx.message.id
+        entry = self.pending.pop(key, None)
+        if entry is None:
+            return
+        scenario, sent = entry
+        scenario.latencies.append((time.perf_counter() - sent) * 1000)
+        if error is None:
+            scenario.completed += 1
+        else:
+            scenario.errors += 1
+            # Hybrid commands wrap twice
+            while hasattr(error, "original"):
+                error = error.original
+            name = type(error).__name__
+            scenario.failures[name] = scenario.failures.get(name, 0) + 1
+
+    async def on_command_completion(self, ctx) -> None:
+        self._done(ctx)
+
+    async def on_command_error(self, ctx, error) -> None:
+        self._done(ctx, error)
+
+    def _payload(self, command: str) -> Tuple[str, Dict[str, Any], bool]:
+        invocations, options = COMMANDS[command]
+        author = self.rng.choice(self.fake.users)
+        if options is not None and self.rng.random() < self.args.interactions:
+            return (
+                "INTERACTION_CREATE",
+                fakediscord.interaction(author, command, options),
+                True,
+            )
+
+        content = self.rng.choice(invocations)
+        if command != "chatter":
+            content = PREFIX + content
+        return (
+            "MESSAGE_CREATE",
+            fakediscord.message(author, content),
+            command != "chatter",
+        )
+
+    async def _inject(self, scenario: Scenario) -> None:
+        # Runs on the fake's loop, paced to the requested rate
+        commands, weights = zip(*scenario.mix.items())
+        total = int(self.args.rate * self.args.duration)
+        start = time.perf_counter()
+        for i in range(total):
+            delay = start + i / self.args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            command = self.rng.choices(commands, weights)[0]
+            event, payload, tracked = self._payload(command)
+            if tracked:
+                scenario.commands += 1
+                self.pending[int(payload["id"])] = (scenario, time.perf_counter())
+            scenario.sent += 1
+            await self.fake.dispatch(event, payload)
+
+    async def run(self, scenario: Scenario) -> Scenario:
+        requests = sum(self.fake.requests.values())
+        self.bot.watchdog.lags.clear()
+
+        start = time.perf_counter()
+        await self.fake.run(self._inject(scenario))
+
+        # Wait for stragglers
+        deadline = time.perf_counter() + self.args.drain
+        while any(s is scenario for s, _ in self.pending.values()):
+            if time.perf_counter() > deadline:
+                break
+            await asyncio.sleep(0.05)
+
+        scenario.duration = time.perf_counter() - start
+        scenario.lags = [lag * 1000 for lag in self.bot.watchdog.lags]
+        scenario.requests = sum(self.fake.requests.values()) - requests
+        for key in [k for k, (s, _) in self.pending.items() if s is scenario]:
+            del self.pending[key]
+        return scenario
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"Unknown command {name!r}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def print_table(reports: Dict[str, Dict[str, Any]]) -> None:
+    print(
+        f"{'scenario':<10} {'sent':>6} {'ok':>6} {'err':>5} {'cmd/s':>8} "
+        f"{'p50':>8} {'p95':>8} {'p99':>8} {'lag p99':>8} {'REST':>6}",
+        file=sys.stderr,
+    )
+    for name, r in reports.items():
+        print(
+            f"{name:<10} {r['sent']:>6} {r['completed']:>6} {r['errors']:>5} "
+            f"{r['throughput']:>8.1f} {r['latency_ms']['p50']:>8.1f} "
+            f"{r['latency_ms']['p95']:>8.1f} {r['latency_ms']['p99']:>8.1f} "
+            f"{r['loop_lag_ms']['p99']:>8.1f} {r['rest_requests']:>6}",
+            file=sys.stderr,
+        )
+
+
+def create_bot(directory: pathlib.Path, **sections: Any):
+    """An AceBot running from `directory`, with rtfm answering offline"""
+    config = {
+        "prefix": PREFIX,
+        "database": {"path": str(directory / "database.db")},
+        "logging": {"file": str(directory / "discord.log")},
+        **sections,
+    }
+    (directory / "config.json").write_text(json.dumps(config))
+    os.chdir(directory)
+
+    # Imported late, the bot reads config.json from the working directory
+    import main
+    from ext import rtfm
+
+    # No network, every rtfm source answers from the bundled inventory
+    data = OBJECTS_INV.read_bytes()
+    rtfm.rtfm_cache = {
+        page: rtfm.parse_object_inv(rtfm.SphinxObjectFileReader(data), page)
+        for page in rtfm.RTFM_PAGES.values()
+    }
+
+    return main.create_bot()
+
+
+async def run(args: argparse.Namespace, directory: pathlib.Path) -> Dict[str, Any]:
+    users = [fakediscord.user(10_000 + i, f"user{i}") for i in range(args.users)]
+    fake = fakediscord.FakeDiscord(users)
+    fake.start()
+    fake.patch()
+
+    # A synthetic recording for benchmarks.replay
+    record = {"recorder": {"path": str(args.record)}} if args.record else {}
+    bot = create_bot(directory, **record)
+    test = LoadTest(bot, fake, args)
+    runner = asyncio.create_task(bot.start("fake-token"))
+    try:
+        await asyncio.wait_for(bot.wait_until_ready(), timeout=60)
+
+        scenarios = [Scenario(name, {name: 1.0}) for name in args.mix]
+        if len(args.mix) > 1:
+            scenarios.append(Scenario("mixed", args.mix))
+
+        reports = {}
+        for scenario in scenarios:
+            reports[scenario.name] = (await test.run(scenario)).report()
+        return reports
+    finally:
+        await bot.close()
+        await asyncio.gather(runner, return_exceptions=True)
+        fake.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=50, help="Events per second")
+    parser.add_argument(
+        "--duration", type=float, default=10, help="Seconds per scenario"
+    )
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix("help,rtfm,cwiki,balance,info"),
+        help="Weighted commands, e.g. rtfm=2,balance=1,chatter=5",
+    )
+    parser.add_argument(
+        "--interactions", type=float, default=0.3, help="Share sent as slash commands"
+    )
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument(
+        "--drain", type=float, default=10, help="Seconds to wait for stragglers"
+    )
+    parser.add_argument(
+        "-o", "--output", type=pathlib.Path, help="Write results as JSON"
+    )
+    parser.add_argument(
+        "--record", type=pathlib.Path, help="Also record the gateway traffic here"
+    )
+    args = parser.parse_args(argv)
+    output = args.output.resolve() if args.output else None
+    if args.record:
+        args.record = args.record.resolve()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        try:
+            reports = asyncio.run(run(args, pathlib.Path(tmp)))
+        finally:
+            os.chdir(cwd)
+
+    print_table(reports)
+    report = {
+        "timestamp": time.time(),
+        "rate": args.rate,
+        "duration": args.duration,
+        "interactions": args.interactions,
+        "scenarios": reports,
+    }
+    if output:
+        output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
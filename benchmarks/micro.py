@@ -0,0 +1,259 @@
+"""Offline microbenchmarks for the bot's pure hot paths
+
+Usage: python -m benchmarks.micro [-k NAME] [-o results.json] [--compare old.json]
+
+Results are written as JSON so runs can be compared, `--compare` exits
+non-zero when a benchmark got slower than `--threshold`."""
+
+import argparse
+import asyncio
+import inspect
+import json
+import pathlib
+import platform
+import random
+import statistics
+import sys
+import time
+import traceback
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+import discord
+
+from ext import rtfm, search
+from games.countryguessr import Country, CountryGuesser
+from utils import misc
+from utils.paginator import Paginator
+
+DATA = pathlib.Path(__file__).parent / "data"
+# Synthetic discord.py inventory, generated from the library's own API names
+OBJECTS_INV = DATA / "objects.inv"
+# Synthetic Python inventory, generated from the standard library's own names
+PYTHON_INV = DATA / "python-objects.inv"
+PYTHON_QUERIES = ["asyncio.gather", "Path.read_text", "dict", "meth:str.split"]
+COUNTRIES = pathlib.Path(__file__).parent.parent / "games" / "countries.json"
+
+Operation = Callable[[], Union[Any, Awaitable[Any]]]
+BENCHMARKS: Dict[str, Callable[[], Operation]] = {}
+
+
+def bench(name: str):
+    """Registers a setup function returning the operation to time"""
+
+    def decorator(setup: Callable[[], Operation]) -> Callable[[], Operation]:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+async def _noop(*args: Any, **kwargs: Any) -> None:
+    pass
+
+
+def _ctx() -> SimpleNamespace:
+    avatar = SimpleNamespace(url="https://cdn/avatar.png")
+    author = SimpleNamespace(id=1, avatar=avatar, display_avatar=avatar)
+    return SimpleNamespace(author=author, reply=_noop, typing=_noop)
+
+
+@bench("misc.clean_string")
+def clean_string() -> Operation:
+    return lambda: misc.clean_string("Côte d'Ivoire, République de Côte d'Ivoire")
+
+
+@bench("misc.time_format")
+def time_format() -> Operation:
+    return lambda: misc.time_format(1_234_567)
+
+
+@bench("misc.clean_traceback")
+def clean_traceback() -> Operation:
+    try:
+        json.loads("{")
+    except ValueError:
+        text = traceback.format_exc()
+    # Paths under the working directory are what gets rewritten
+    text += (
+        f'  File "{pathlib.Path.cwd() / "cogs" / "admin.py"}", line 1, in sql\n' * 10
+    )
+    return lambda: misc.clean_traceback(text)
+
+
+@bench("Paginator.add_line x5000")
+def paginator_add_line() -> Operation:
+    ctx = _ctx()
+    lines = [f"`{i:>5}` some line of paginated output" for i in range(5000)]
+
+    def run():
+        paginator = Paginator(ctx, embed=discord.Embed(), max_lines=15)
+        for line in lines:
+            paginator.add_line(line)
+
+    return run
+
+
+@bench("rtfm.parse_object_inv")
+def parse_object_inv() -> Operation:
+    data = OBJECTS_INV.read_bytes()
+    return lambda: rtfm.parse_object_inv(
+        rtfm.SphinxObjectFileReader(data), "https://discordpy.readthedocs.io/en/stable"
+    )
+
+
+@bench("rtfm.do_rtfm ranking")
+def do_rtfm() -> Operation:
+    source = rtfm.Source("stable", rtfm.RTFM_PAGES["stable"])
+    rtfm.rtfm_cache = {
+        source.page: rtfm.parse_object_inv(
+            rtfm.SphinxObjectFileReader(OBJECTS_INV.read_bytes()), source.page
+        )
+    }
+    # Indexed when loaded, not on the first query
+    rtfm._indexes[source.page] = search.SearchIndex(rtfm.rtfm_cache[source.page])
+    ctx = _ctx()
+    queries = ["Client.fetch_user", "ctx.send", "Embed", "attr:Member.roles", "intents"]
+    return lambda: asyncio.gather(*(rtfm.do_rtfm(ctx, source, q) for q in queries))
+
+
+def _python_inventory() -> rtfm.Inventory:
+    return rtfm.parse_object_inv(
+        rtfm.SphinxObjectFileReader(PYTHON_INV.read_bytes()),
+        rtfm.RTFM_PAGES["python"],
+    )
+
+
+@bench("search.linear_search python x4")
+def linear_search() -> Operation:
+    inventory = _python_inventory()
+    return lambda: [search.linear_search(inventory, q) for q in PYTHON_QUERIES]
+
+
+@bench("SearchIndex.search python x4")
+def index_search() -> Operation:
+    inventory = _python_inventory()
+    index = search.SearchIndex(inventory)
+    # Only worth timing if it ranks like the scan it replaces
+    for query in PYTHON_QUERIES:
+        expected = [name for name, _ in search.linear_search(inventory, query)]
+        if [name for name, _ in index.search(query)] != expected:
+            raise AssertionError(f"SearchIndex and linear_search disagree on {query}")
+    return lambda: [index.search(q) for q in PYTHON_QUERIES]
+
+
+@bench("CountryGuesser.text_input x250")
+def text_input() -> Operation:
+    countries = [Country(c) for c in json.loads(COUNTRIES.read_text("utf-8"))]
+    rng = random.Random(0)
+    # A typo'd guess for every country, checked against that round's country
+    rounds = []
+    for country in countries:
+        name = list(country.names[0])
+        name[rng.randrange(len(name))] = "x"
+        rounds.append((country, "".join(name)))
+
+    game = CountryGuesser.__new__(CountryGuesser)
+    game.gamemaster = SimpleNamespace(id=1)
+    author = SimpleNamespace(id=2)
+
+    def run():
+        for country, guess in rounds:
+            game.country = country
+            game.text_input(
+                SimpleNamespace(content=guess, author=author, add_reaction=_noop)
+            )
+
+    return run
+
+
+async def measure(operation: Operation, budget: float, repeat: int) -> Dict[str, Any]:
+    async def sample(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            result = operation()
+            if inspect.isawaitable(result):
+                await result
+        elapsed = time.perf_counter() - start
+        # Let tasks created by the operation (reactions...) run, untimed
+        await asyncio.sleep(0)
+        return elapsed
+
+    # Calibrate the amount of calls per sample so each takes ~budget
+    number = 1
+    while (elapsed := await sample(number)) < budget / 10:
+        number *= 10
+    number = max(1, int(number * budget / elapsed))
+
+    samples = [await sample(number) / number * 1e6 for _ in range(repeat)]
+
+    return {
+        "median_us": statistics.median(samples),
+        "min_us": min(samples),
+        "stdev_us": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def compare(results: Dict[str, Any], old: Dict[str, Any], threshold: float) -> bool:
+    """Prints the change against an older run, returns whether anything regressed"""
+    regressed = False
+    for name, result in results.items():
+        previous = old.get(name)
+        if previous is None:
+            continue
+        ratio = result["median_us"] / previous["median_us"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag, regressed = "  REGRESSION", True
+        print(f"{name:<34} x{ratio:.2f}{flag}")
+    return regressed
+
+
+async def run(names: List[str], budget: float, repeat: int) -> Dict[str, Any]:
+    results = {}
+    for name in names:
+        operation = BENCHMARKS[name]()
+        results[name] = result = await measure(operation, budget, repeat)
+        print(
+            f"{name:<34} {result['median_us']:>14,.2f} µs/op  (min {result['min_us']:,.2f}, n={result['number']})",
+            file=sys.stderr,
+        )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-k", "--filter", help="Only run benchmarks containing this")
+    parser.add_argument(
+        "-o", "--output", type=pathlib.Path, help="Write results as JSON"
+    )
+    parser.add_argument("--compare", type=pathlib.Path, help="Previous JSON results")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed slowdown")
+    parser.add_argument("--budget", type=float, default=0.2, help="Seconds per sample")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    names = [n for n in BENCHMARKS if not args.filter or args.filter in n]
+    results = asyncio.run(run(names, args.budget, args.repeat))
+
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        old = json.loads(args.compare.read_text())["results"]
+        return int(compare(results, old, args.threshold))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
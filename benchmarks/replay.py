@@ -0,0 +1,287 @@
+"""Replays a recorded gateway session into AceBot through a fake Discord
+
+Usage: python -m benchmarks.replay gateway.jsonl.gz [--speed 1] [-o results.json]
+                                   [--compare old.json] [--threshold 0.1]
+
+Record production traffic by adding `"recorder": {"path": "gateway.jsonl.gz"}`
+to config.json, recordings contain message content so keep them private.
+
+READY and the GUILD_CREATE burst after it are sent when the bot identifies,
+everything after is paced by its recorded offsets divided by `--speed`, or
+sent as fast as possible with `--speed 0`. Two builds replaying the same
+recording can then be compared on CPU time, memory and command latency."""
+
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import psutil
+
+from benchmarks import fakediscord
+from benchmarks.loadtest import create_bot, percentile
+from ext import recorder
+
+# Answers to requests the replaying bot makes itself, or session bookkeeping
+SKIPPED = {"READY", "RESUMED", "GUILD_MEMBERS_CHUNK"}
+TRACKED = {"MESSAGE_CREATE", "INTERACTION_CREATE"}
+
+
+@dataclass
+class Event:
+    offset: float
+    type: str
+    raw: str
+    id: Optional[int] = None  # Messages and interactions, to time commands
+
+
+def load(path: pathlib.Path) -> Tuple[Optional[Dict[str, Any]], List[str], List[Event]]:
+    """The recorded READY, the payloads sent on identify and the workload"""
+    _, payloads = recorder.read(str(path))
+    ready: Optional[Dict[str, Any]] = None
+    startup: List[str] = []
+    events: List[Event] = []
+    for offset, raw in payloads:
+        payload = json.loads(raw)
+        if payload.get("op") != 0:
+            continue
+
+        event = payload["t"]
+        if event == "READY" and ready is None:
+            ready = payload["d"]
+            startup.append(raw)
+            continue
+        if event == "GUILD_CREATE" and ready is not None and not events:
+            startup.append(raw)
+            continue
+        if event in SKIPPED:
+            continue
+
+        id = int(payload["d"]["id"]) if event in TRACKED else None
+        events.append(Event(offset, event, raw, id))
+
+    if events:
+        first = events[0].offset
+        for event in events:
+            event.offset -= first
+    return ready, startup, events
+
+
+class Replay:
+    def __init__(self, bot, fake: fakediscord.FakeDiscord, speed: float) -> None:
+        self.bot = bot
+        self.fake = fake
+        self.speed = speed
+        self.sent: Dict[int, float] = {}  # Message or interaction id -> sent at
+        self.latencies: Dict[str, List[float]] = {}  # Command -> ms
+        self.errors: Dict[str, int] = {}
+        self.running: Set[int] = set()  # Invoked, not yet completed
+
+        bot.add_listener(self.on_command)
+        bot.add_listener(self.on_command_completion)
+        bot.add_listener(self.on_command_error)
+
+    @staticmethod
+    def _key(ctx) -> int:
+        return ctx.interaction.id if ctx.interaction else ctx.message.id
+
+    def _done(self, ctx, error: bool) -> None:
+        key = self._key(ctx)
+        self.running.discard(key)
+        sent = self.sent.pop(key, None)
+        if sent is None or ctx.command is None:
+            return
+        name = ctx.command.qualified_name
+        self.latencies.setdefault(name, []).append((time.perf_counter() - sent) * 1000)
+        if error:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    async def on_command(self, ctx) -> None:
+        self.running.add(self._key(ctx))
+
+    async def on_command_completion(self, ctx) -> None:
+        self._done(ctx, False)
+
+    async def on_command_error(self, ctx, error) -> None:
+        self._done(ctx, True)
+
+    async def _inject(self, events: List[Event]) -> None:
+        # Runs on the fake's loop
+        start = time.perf_counter()
+        for event in events:
+            if self.speed:
+                delay = start + event.offset / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if event.id is not None:
+                self.sent[event.id] = time.perf_counter()
+            await self.fake.send(event.raw)
+
+    def _received(self) -> int:
+        return sum(self.bot.gateway_stats.totals.values())
+
+    async def run(self, events: List[Event], drain: float) -> Dict[str, Any]:
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        received = self._received()
+        requests = sum(self.fake.requests.values())
+        self.bot.watchdog.lags.clear()
+
+        start = time.perf_counter()
+        cpu, loop_cpu = time.process_time(), time.thread_time()
+        await self.fake.run(self._inject(events))
+
+        # Until every event went through the bot and the commands they invoked
+        # finished, checked twice as listeners start a loop iteration later
+        deadline = time.perf_counter() + drain
+        settled = 0
+        while time.perf_counter() < deadline and settled < 2:
+            idle = self._received() - received >= len(events) and not self.running
+            settled = settled + 1 if idle else 0
+            await asyncio.sleep(0.01)
+
+        elapsed = time.perf_counter() - start
+        end = process.memory_info().rss
+        cpu, loop_cpu = time.process_time() - cpu, time.thread_time() - loop_cpu
+        everything = [ms for values in self.latencies.values() for ms in values]
+        lags = [lag * 1000 for lag in self.bot.watchdog.lags]
+        return {
+            "events": len(events),
+            "received": self._received() - received,
+            "wall_s": elapsed,
+            "events_per_s": len(events) / elapsed if elapsed else 0.0,
+            "cpu_s": {"process": cpu, "loop": loop_cpu},
+            "memory_mb": {
+                "start": rss / 1024**2,
+                "end": end / 1024**2,
+                # Linux reports kilobytes
+                "peak": max(
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, end
+                )
+                / 1024**2,
+            },
+            "latency_ms": _summary(everything),
+            "commands": {
+                name: _summary(values) | {"errors": self.errors.get(name, 0)}
+                for name, values in sorted(self.latencies.items())
+            },
+            "loop_lag_ms": {f"p{p}": percentile(lags, p) for p in (50, 99)}
+            | {"max": max(lags, default=0.0)},
+            "rest_requests": sum(self.fake.requests.values()) - requests,
+        }
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {"count": len(values)} | {
+        f"p{p}": percentile(values, p) for p in (50, 95, 99)
+    }
+
+
+# Lower is better for all of these
+COMPARED = (
+    ("cpu_s", "process"),
+    ("cpu_s", "loop"),
+    ("memory_mb", "end"),
+    ("memory_mb", "peak"),
+    ("latency_ms", "p50"),
+    ("latency_ms", "p95"),
+    ("latency_ms", "p99"),
+    ("loop_lag_ms", "p99"),
+)
+
+
+def compare(report: Dict[str, Any], old: Dict[str, Any], threshold: float) -> bool:
+    """Prints the change against an older run, returns whether anything regressed"""
+    regressed = False
+    for section, key in COMPARED:
+        before, after = old[section][key], report[section][key]
+        if not before:
+            continue
+        ratio = after / before
+        flag = ""
+        if ratio > 1 + threshold:
+            flag, regressed = "  REGRESSION", True
+        name = f"{section}.{key}"
+        print(f"{name:<18} {before:>10.2f} -> {after:>10.2f}  x{ratio:.2f}{flag}")
+    return regressed
+
+
+async def run(args: argparse.Namespace, directory: pathlib.Path) -> Dict[str, Any]:
+    ready, startup, events = load(args.recording)
+    users = [fakediscord.user(10_000 + i, f"user{i}") for i in range(10)]
+    if ready is None:
+        # Recorded mid-session, the synthetic guild stands in
+        fake = fakediscord.FakeDiscord(users)
+    else:
+        fake = fakediscord.FakeDiscord(
+            users,
+            bot=ready["user"],
+            application_id=int(ready.get("application", {}).get("id", 0)),
+        )
+        fake.startup = startup
+    fake.start()
+    fake.patch()
+
+    bot = create_bot(directory)
+    replay = Replay(bot, fake, args.speed)
+    runner = asyncio.create_task(bot.start("fake-token"))
+    try:
+        await asyncio.wait_for(bot.wait_until_ready(), timeout=120)
+        return await replay.run(events, args.drain)
+    finally:
+        await bot.close()
+        await asyncio.gather(runner, return_exceptions=True)
+        fake.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording", type=pathlib.Path)
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="Replay speed, 0 for unpaced"
+    )
+    parser.add_argument(
+        "--drain", type=float, default=30, help="Seconds to wait for the bot after"
+    )
+    parser.add_argument(
+        "-o", "--output", type=pathlib.Path, help="Write results as JSON"
+    )
+    parser.add_argument("--compare", type=pathlib.Path, help="Previous JSON results")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed increase")
+    args = parser.parse_args(argv)
+    args.recording = args.recording.resolve()
+    output = args.output.resolve() if args.output else None
+    previous = args.compare.resolve() if args.compare else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        try:
+            result = asyncio.run(run(args, pathlib.Path(tmp)))
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "timestamp": time.time(),
+        "recording": str(args.recording),
+        "speed": args.speed,
+        **result,
+    }
+    if output:
+        output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+    if previous:
+        return int(compare(report, json.loads(previous.read_text()), args.threshold))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Command-statistics write throughput, asqlite's pragmas vs ext.database.PRAGMAS
+
+Usage: python -m benchmarks.statistics_writes [-n COMMANDS]"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from ext import database
+
+UPSERT = "INSERT INTO statistics (id, key, value) VALUES (?, ?, ?) ON CONFLICT(id, key) DO UPDATE SET value = value + excluded.value;"
+
+# What asqlite opens connections with before the profile: WAL, synchronous=FULL
+DEFAULT_PRAGMAS: Dict[str, Any] = {"journal_mode": "wal", "synchronous": "full"}
+
+
+def connect(path: str, pragmas: Dict[str, Any]) -> sqlite3.Connection:
+    # Autocommit, the way asqlite opens its connections
+    conn = sqlite3.connect(path, isolation_level=None)
+    database.apply_pragmas(pragmas)(conn)
+    conn.execute(
+        "CREATE TABLE statistics (id INTEGER DEFAULT (0), key TEXT NOT NULL, value INTEGER DEFAULT (0), PRIMARY KEY(id, key));"
+    )
+    return conn
+
+
+def per_command(conn: sqlite3.Connection, rows: List[Tuple[int, str, int]]) -> None:
+    # One upsert + commit per command, what log_commands_run used to do
+    for row in rows:
+        conn.execute(UPSERT, row)
+
+
+def batched(conn: sqlite3.Connection, rows: List[Tuple[int, str, int]]) -> None:
+    # Merged increments in a single transaction, what ext.statistics does
+    merged: Dict[Tuple[int, str], int] = {}
+    for id, key, value in rows:
+        merged[(id, key)] = merged.get((id, key), 0) + value
+    conn.execute("BEGIN;")
+    conn.executemany(UPSERT, [(id, key, value) for (id, key), value in merged.items()])
+    conn.execute("COMMIT;")
+
+
+def run(
+    pragmas: Dict[str, Any],
+    writer: Callable[[sqlite3.Connection, List[Tuple[int, str, int]]], None],
+    rows: List[Tuple[int, str, int]],
+) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = connect(os.path.join(tmp, "bench.db"), pragmas)
+        timer = time.perf_counter()
+        writer(conn, rows)
+        elapsed = time.perf_counter() - timer
+        conn.close()
+    return len(rows) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--commands", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    names = [f"CMD_RAN:command{i}" for i in range(40)]
+    guilds = [random.getrandbits(60) for _ in range(50)]
+    rows = [
+        (random.choice(guilds), random.choice(names), 1) for _ in range(args.commands)
+    ]
+
+    profile = database.pragma_profile()
+    results = [
+        ("asqlite pragmas, per command", run(DEFAULT_PRAGMAS, per_command, rows)),
+        ("profile pragmas, per command", run(profile, per_command, rows)),
+        ("profile pragmas, batched", run(profile, batched, rows)),
+    ]
+
+    baseline = results[0][1]
+    for name, throughput in results:
+        print(f"{name:<30} {throughput:>12,.0f} cmd/s  x{throughput / baseline:,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
 from pkgutil import iter_modules
 
 EXTENSIONS = [module.name for module in iter_modules(__path__, f"{__package__}.")]
+
+# Extensions that must load after others, the rest load concurrently
+# e.g. {"cogs.help": ["cogs.admin"]}
+DEPENDENCIES: dict[str, list[str]] = {}
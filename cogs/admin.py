@@ -1,12 +1,19 @@
+import asyncio
+import csv
 import difflib
+import io
+import json
 import time
+import tracemalloc
 from typing import TYPE_CHECKING, Annotated, Any, Literal, Optional, Union
 
 import discord
+import psutil
 from discord import app_commands
 from discord.ext import commands
 from tabulate import tabulate
 
+from ext import memory
 from utils import misc, subclasses
 from utils.errors import NotYourButton
 
@@ -22,6 +29,7 @@ class Admin(subclasses.Cog):
             bot=bot,
             emoji="\N{NAME BADGE}",
         )
+        self.tracer = memory.Tracer()
 
     @commands.group(aliases=["perms", "rights"], invoke_without_command=True)
     async def permissions(
@@ -359,13 +367,18 @@ class Admin(subclasses.Cog):
         e.g: `admin` or `cogs.admin`"""
         # RELOAD ALL
         if extension.casefold() in ["*", "all"]:
-            reloaded = []
-            for ext in EXTENSIONS:
-                reloaded.append(ext)
-                await self.bot.reload_extension(ext)
-
             timer = time.time()
 
+            reloaded = []
+            if self.bot.cluster:
+                # Every cluster reloads, this one included
+                replies = await self.bot.cluster.broadcast("reload")
+                reloaded = sorted({ext for r in replies for ext in r["data"] or []})
+            else:
+                for ext in EXTENSIONS:
+                    reloaded.append(ext)
+                    await self.bot.reload_extension(ext)
+
             embed = discord.Embed(
                 title=":gear: Reloaded All Modules",
                 description=f">>> "
@@ -543,10 +556,329 @@ class Admin(subclasses.Cog):
         embed.set_footer(text=f"Took {(time.time() - timer)*1000:.2f}ms")
         await ctx.reply(embed=embed, delete_after=5, mention_author=False)
 
+    @commands.is_owner()
+    @commands.command(aliases=["boot"])
+    async def startup(self, ctx: commands.Context):
+        """Shows how long each extension took to load"""
+        data = [
+            [
+                t.name,
+                f"{t.imported * 1000:.0f}",
+                f"{t.setup * 1000:.0f}",
+                f"{t.cog_load * 1000:.0f}",
+                f"{t.total * 1000:.0f}" if not t.error else "failed",
+            ]
+            for t in sorted(
+                self.bot.startup.values(), key=lambda t: t.total, reverse=True
+            )
+        ]
+        table = tabulate(
+            data, headers=["Extension", "Import", "Setup", "Load", "Total"]
+        )
+        embed = discord.Embed(
+            title=":stopwatch: Startup",
+            description=f"```\n{table}```",
+            color=discord.Color.blurple(),
+        )
+        embed.set_footer(
+            text=f"Loaded concurrently in {self.bot.startup_time * 1000:.0f}ms • times in ms"
+        )
+        for t in self.bot.startup.values():
+            if t.error:
+                embed.add_field(name=t.name, value=f"> {t.error}", inline=False)
+
+        await ctx.reply(embed=embed, mention_author=False)
+
+    @commands.is_owner()
+    @commands.command(name="logs")
+    async def log_stats(self, ctx: commands.Context):
+        """Shows the state of the logging queue"""
+        pipeline = self.bot.logs
+        embed = discord.Embed(
+            title=":scroll: Logging",
+            description=(
+                f"{misc.space}queue: `{pipeline.depth:,}/{pipeline.capacity:,}`\n"
+                f"{misc.space}dropped: `{pipeline.dropped:,}`"
+            ),
+            color=discord.Color.blurple(),
+        )
+        sampler = pipeline.sampler
+        if sampler.rates:
+            embed.add_field(
+                name="Sampling",
+                value="\n".join(
+                    f"{misc.space}{name} (1/{rate}): `{sampler.sampled.get(name, 0):,}` skipped"
+                    for name, rate in sampler.rates.items()
+                ),
+            )
+        await ctx.reply(embed=embed, mention_author=False)
+
+    @commands.is_owner()
+    @commands.command(name="latency", aliases=["lat"])
+    async def command_latency(self, ctx: commands.Context, *, command: str = None):
+        """Shows p50/p95/p99 latencies per command, or per phase of a command"""
+        stats = self.bot.latency_stats
+        if command:
+            cmd = self.bot.get_command(command)
+            histograms = stats.get(cmd.qualified_name if cmd else command)
+            if not histograms:
+                return await ctx.reply(
+                    f"No samples for `{command}`", delete_after=5, mention_author=False
+                )
+
+            title = f"Latency for {cmd.qualified_name if cmd else command}"
+            headers = ["Phase", "p50", "p95", "p99", "max"]
+            rows = histograms.items()
+        else:
+            title = "Command latency"
+            headers = ["Command", "p50", "p95", "p99", "max"]
+            rows = sorted(
+                ((name, h["total"]) for name, h in stats.commands.items()),
+                key=lambda r: r[1].count,
+                reverse=True,
+            )[:15]
+
+        data = [
+            [
+                name,
+                f"{h.percentile(50):.1f}",
+                f"{h.percentile(95):.1f}",
+                f"{h.percentile(99):.1f}",
+                f"{h.max:.1f}",
+            ]
+            for name, h in rows
+        ]
+        embed = discord.Embed(
+            title=f":stopwatch: {title}",
+            description=f"```\n{tabulate(data, headers=headers)}```",
+            color=discord.Color.blurple(),
+        )
+        embed.set_footer(text="times in ms")
+        await ctx.reply(embed=embed, mention_author=False)
+
+    @commands.is_owner()
+    @commands.command(name="lag")
+    async def loop_lag(self, ctx: commands.Context):
+        """Shows event loop lag and the latest stalls"""
+        wd = self.bot.watchdog
+        embed = discord.Embed(
+            title=":hourglass: Event loop lag",
+            description=" ".join(
+                f"p{p}: `{wd.percentile(p) * 1000:.1f}ms`" for p in (50, 95, 99)
+            )
+            + f"\n{misc.space}{misc.curve} over `{len(wd.lags):,}` samples, threshold `{wd.threshold * 1000:.0f}ms`",
+            color=discord.Color.blurple(),
+        )
+        for stall in reversed(wd.recent(3)):
+            # Innermost frames are the interesting ones
+            stack = misc.clean_traceback("".join(stall.stack.splitlines(True)[-8:]))
+            embed.add_field(
+                name=f"{stall.duration * 1000:.0f}ms in {stall.label or stall.task}",
+                value=f"<t:{int(stall.at)}:R>```py\n{stack[-900:]}```",
+                inline=False,
+            )
+        if not wd.stalls:
+            embed.set_footer(text="No stalls recorded")
+
+        await ctx.reply(embed=embed, mention_author=False)
+
+    @commands.is_owner()
+    @commands.command(name="events", aliases=["gateway"])
+    async def gateway_events(self, ctx: commands.Context):
+        """Shows gateway event rates and the slowest listeners"""
+        stats = self.bot.gateway_stats
+        events = [
+            [event_type, f"{total:,}", *(f"{rate:.2f}" for rate in rates)]
+            for event_type, total, rates in stats.rates()[:12]
+        ]
+        listeners = [
+            [name, f"{calls:,}", f"{total / calls * 1000:.1f}", f"{slowest * 1000:.1f}"]
+            for name, (calls, total, slowest) in sorted(
+                stats.listeners.items(), key=lambda r: r[1][1], reverse=True
+            )[:10]
+        ]
+
+        embed = discord.Embed(
+            title=":satellite: Gateway events",
+            description=f"```\n{tabulate(events, headers=['Event', 'Total', '1m/s', '5m/s', '60m/s'])}```",
+            color=discord.Color.blurple(),
+        )
+        embed.add_field(
+            name="Listeners",
+            value=f"```\n{tabulate(listeners, headers=['Listener', 'Calls', 'Avg', 'Max'])}```",
+            inline=False,
+        )
+        embed.set_footer(text="listener times in ms, by total time spent")
+        await ctx.reply(embed=embed, mention_author=False)
+
+    @commands.is_owner()
+    @commands.command(name="ratelimits", aliases=["http"])
+    async def http_ratelimits(self, ctx: commands.Context):
+        """Shows REST requests per route, their buckets and 429s by command"""
+        stats = self.bot.http_stats
+        routes = [
+            [
+                route[:40],
+                f"{r.requests:,}",
+                f"{r.latency.percentile(50):.0f}",
+                f"{r.latency.percentile(99):.0f}",
+                r.ratelimited,
+                f"{r.remaining}/{r.limit}" if r.limit is not None else "-",
+                f"{r.waited:.1f}",
+            ]
+            for route, r in sorted(
+                stats.routes.items(), key=lambda r: r[1].requests, reverse=True
+            )[:12]
+        ]
+        sources = [
+            [label[:24], route[:30], f"{requests:,}", ratelimited]
+            for (route, label), (requests, ratelimited) in sorted(
+                stats.sources.items(), key=lambda r: (r[1][1], r[1][0]), reverse=True
+            )[:8]
+        ]
+
+        embed = discord.Embed(
+            title=":traffic_light: HTTP rate limits",
+            description=f"```\n{tabulate(routes, headers=['Route', 'Reqs', 'p50', 'p99', '429', 'Left', 'Wait s'])}```",
+            color=discord.Color.blurple(),
+        )
+        embed.add_field(
+            name="By source",
+            value=f"```\n{tabulate(sources, headers=['Source', 'Route', 'Reqs', '429'])}```",
+            inline=False,
+        )
+        if stats.hits:
+            embed.add_field(
+                name="Latest 429s",
+                value="\n".join(
+                    f"<t:{int(hit.at)}:R> `{hit.route}` from `{hit.source}`\n"
+                    f"{misc.space}{misc.curve} retry after `{hit.retry_after:.2f}s` ({hit.scope})"
+                    for hit in list(stats.hits)[-5:]
+                ),
+                inline=False,
+            )
+        embed.set_footer(text="latency in ms, wait is time held back by rate limits")
+        await ctx.reply(embed=embed, mention_author=False)
+
+    @commands.is_owner()
+    @commands.command(name="resources", aliases=["res"])
+    async def resource_series(
+        self, ctx: commands.Context, format: Literal["csv", "json"] = "csv"
+    ):
+        """Exports the sampled CPU, memory, fds, threads, tasks and loop lag"""
+        sampler = self.bot.resources
+        series = sampler.export()
+        if not series:
+            return await ctx.reply(
+                "No samples yet", delete_after=5, mention_author=False
+            )
+
+        buffer = io.StringIO()
+        if format == "json":
+            json.dump(series, buffer)
+        else:
+            writer = csv.DictWriter(buffer, fieldnames=series[0].keys())
+            writer.writeheader()
+            writer.writerows(series)
+
+        data = [
+            [metric, f"{low:,.1f}", f"{mean:,.1f}", f"{high:,.1f}"]
+            for metric, (low, mean, high) in sampler.summary(3600).items()
+        ]
+        embed = discord.Embed(
+            title=":chart_with_upwards_trend: Resources",
+            description=f"```\n{tabulate(data, headers=['Metric', 'Min', 'Avg', 'Max'])}```",
+            color=discord.Color.blurple(),
+        )
+        embed.set_footer(
+            text=f"{len(series)} samples every {sampler.interval:.0f}s • "
+            "last hour • cpu %, rss MB, lag ms"
+        )
+        await ctx.reply(
+            embed=embed,
+            file=discord.File(
+                io.BytesIO(buffer.getvalue().encode()), filename=f"resources.{format}"
+            ),
+            mention_author=False,
+        )
+
+    @commands.is_owner()
+    @commands.command(name="memory", aliases=["mem"])
+    async def memory_stats(
+        self,
+        ctx: commands.Context,
+        action: Literal["census", "start", "diff", "stop"] = "census",
+        frames: commands.Range[int, 1, 100] = 1,
+    ):
+        """Shows live instances of the bot's classes, or traces allocations
+
+        `start [frames]` starts tracemalloc, `diff` shows what grew by file and
+        line since the previous snapshot and `stop` stops tracing"""
+        tracer = self.tracer
+        if action == "start":
+            await asyncio.to_thread(tracer.start, frames)
+            return await ctx.reply(
+                f"Tracing allocations ({frames} frame{'s' * (frames > 1)}), baseline taken",
+                mention_author=False,
+            )
+        if action == "stop":
+            tracer.stop()
+            return await ctx.reply("Stopped tracing allocations", mention_author=False)
+
+        if action == "diff":
+            if not tracer.tracing:
+                return await ctx.reply(
+                    "Not tracing, use `memory start` first",
+                    delete_after=5,
+                    mention_author=False,
+                )
+            since = tracer.taken
+            diffs = await asyncio.to_thread(tracer.diff, 10)
+            current, peak = tracemalloc.get_traced_memory()
+            embed = discord.Embed(
+                title=":mag: Allocations",
+                description="\n".join(
+                    f"`{d.size_diff / 1024:+,.1f}KB` `{d.count_diff:+,}` {misc.clean_traceback(d.location)}\n"
+                    f"{misc.space}{misc.curve} `{d.line[:80] or '?'}`"
+                    for d in diffs
+                )
+                or "No snapshot to compare with yet, diff again later",
+                color=discord.Color.blurple(),
+            )
+            embed.set_footer(
+                text=f"Since {time.strftime('%H:%M:%S', time.localtime(since))} • "
+                f"traced {current / 1024**2:,.1f}MB, peak {peak / 1024**2:,.1f}MB"
+            )
+            return await ctx.reply(embed=embed, mention_author=False)
+
+        entries = await asyncio.to_thread(memory.census)
+        data = [
+            [name, e.category, f"{e.instances:,}", f"{e.retained / 1024:,.1f}"]
+            for name, e in sorted(
+                entries.items(), key=lambda e: e[1].retained, reverse=True
+            )[:20]
+        ]
+        rss = psutil.Process().memory_info().rss
+        embed = discord.Embed(
+            title=":brain: Live objects",
+            description=f"```\n{tabulate(data, headers=['Class', 'Kind', 'Alive', 'KB'])}```",
+            color=discord.Color.blurple(),
+        )
+        embed.set_footer(
+            text=f"RSS {rss / 1024**2:,.1f}MB • {len(self.bot.games)} games in bot.games"
+            f" • tracemalloc {'on' if tracer.tracing else 'off'}"
+        )
+        await ctx.reply(embed=embed, mention_author=False)
+
     @commands.is_owner()
     @commands.command()
     async def sql(self, ctx: commands.Context, *, command: str):
-        """Executes SQL commands to the database"""
+        """Executes SQL commands to the database
+
+        `stats` lists the heaviest queries instead"""
+        if command.strip().lower() == "stats":
+            return await self.sql_stats(ctx)
+
         async with self.bot.pool.acquire() as conn:
             r = await conn.fetchall(command) or await conn.execute(command)
             await conn.commit()
@@ -565,6 +897,40 @@ class Admin(subclasses.Cog):
                 mention_author=False,
             )
 
+    async def sql_stats(self, ctx: commands.Context):
+        queries = self.bot.queries
+        heaviest = queries.heaviest(10)
+        data = [
+            [
+                i,
+                f"{q.latency.count:,}",
+                f"{q.latency.sum:.0f}",
+                f"{q.latency.sum / q.latency.count:.1f}" if q.latency.count else "-",
+                f"{q.latency.percentile(99):.1f}",
+                f"{q.latency.max:.1f}",
+                q.slow,
+                q.errors,
+            ]
+            for i, (_, q) in enumerate(heaviest, 1)
+        ]
+        embed = discord.Embed(
+            title=":floppy_disk: Heaviest queries",
+            description=f"```\n{tabulate(data, headers=['#', 'Calls', 'Total', 'Avg', 'p99', 'Max', 'Slow', 'Err'])}```\n"
+            + "\n".join(f"`{i}` `{sql[:90]}`" for i, (sql, _) in enumerate(heaviest, 1)),
+            color=discord.Color.blurple(),
+        )
+
+        # Plan of the worst query that was slow
+        planned = next(((sql, q) for sql, q in heaviest if q.plan), None)
+        if planned:
+            embed.add_field(
+                name="Query plan",
+                value=f"`{planned[0][:200]}`\n```\n{planned[1].plan[:700]}```",
+                inline=False,
+            )
+        embed.set_footer(text=f"times in ms, slow is over {queries.slow_ms:.0f}ms")
+        await ctx.reply(embed=embed, mention_author=False)
+
     @commands.command(
         aliases=[
             "killyourself",
@@ -630,7 +996,7 @@ class Admin(subclasses.Cog):
     async def sync(
         self,
         ctx: commands.Context,
-        guilds: commands.Greedy[discord.Guild],
+        guilds: commands.Greedy[discord.Object],
         spec: Literal["list", "global", "*", "all", "local", "~", "^", "clear"] = None,
     ):
         if not guilds:
@@ -728,31 +1094,22 @@ class Admin(subclasses.Cog):
             config = {
                 _name: _setting.default for _name, _setting in module.config.items()
             }
-            async with self.bot.pool.acquire() as conn:
-                if not setting:
-                    config.update(
-                        {
-                            row[0].split(":")[1]: row[1]
-                            for row in await conn.fetchall(
-                                "SELECT key, value FROM guildConfig WHERE key LIKE :key AND id = :id;",
-                                {
-                                    "id": ctx.guild.id,
-                                    "key": f"{module.qualified_name}:%",
-                                },
-                            )
-                        }
-                    )
-                else:
-                    config = {
-                        row[0].split(":")[1]: row[1]
-                        for row in await conn.fetchall(
-                            "SELECT key, value FROM guildConfig WHERE key LIKE :key AND id = :id;",
-                            {
-                                "id": ctx.guild.id,
-                                "key": f"{module.qualified_name}:{setting}",
-                            },
-                        )
+            stored = await self.bot.guild_config.fetch(ctx.guild.id)
+            prefix = f"{module.qualified_name}:"
+            if not setting:
+                config.update(
+                    {
+                        key.split(":")[1]: value
+                        for key, value in stored.items()
+                        if key.startswith(prefix)
                     }
+                )
+            else:
+                config = (
+                    {setting: stored[prefix + setting]}
+                    if prefix + setting in stored
+                    else {}
+                )
 
             embed = discord.Embed(
                 title=f"\N{GEAR}\N{VARIATION SELECTOR-16} Config for {module.qualified_name}",
@@ -769,35 +1126,23 @@ class Admin(subclasses.Cog):
             return await ctx.reply(embed=embed, mention_author=False)
 
         ## Set config
-        async with self.bot.pool.acquire() as conn:
-            if value.casefold() in {"none", "false", "no", "0"}:
-                await conn.execute(
-                    "DELETE FROM guildConfig WHERE key = :key AND id = :id;",
-                    {"key": f"{module.qualified_name}:{setting}", "id": ctx.guild.id},
-                )
-                value = None
-            else:
-                # Convert value
-                value: module.config[setting].annotation = (
-                    await commands.run_converters(
-                        ctx,
-                        module.config[setting].annotation,
-                        value,
-                        commands.Parameter,
-                    )
-                )
+        if value.casefold() in {"none", "false", "no", "0"}:
+            value = None
+        else:
+            # Convert value
+            value: module.config[setting].annotation = await commands.run_converters(
+                ctx,
+                module.config[setting].annotation,
+                value,
+                commands.Parameter,
+            )
 
-                # Get id incase its a discord object
-                value = getattr(value, "id", value)
+            # Get id incase its a discord object
+            value = getattr(value, "id", value)
 
-                await conn.execute(
-                    "INSERT INTO guildConfig (id, key, value) VALUES (:id, :key, :value) ON CONFLICT(id, key) DO UPDATE SET value = :value;",
-                    {
-                        "id": ctx.guild.id,
-                        "key": f"{module.qualified_name}:{setting}",
-                        "value": value,
-                    },
-                )
+        await self.bot.guild_config.set(
+            ctx.guild.id, f"{module.qualified_name}:{setting}", value
+        )
 
         embed = discord.Embed(
             title=f"\N{GEAR}\N{VARIATION SELECTOR-16} Updated config for {module.qualified_name}",
@@ -24,13 +24,18 @@ class Bank:
             existing_account = await conn.fetchone(
                 "SELECT * FROM economy WHERE id = :account;", {"account": account}
             )
-            if not existing_account:
-                await conn.execute(
-                    "INSERT INTO economy (id, money) VALUES (:account, :default);",
-                    {"account": account, "default": 20},
-                )
-                return 20
-            return existing_account[1]
+            if existing_account:
+                return existing_account[1]
+
+            # Concurrent first calls all insert, whichever ran first is kept
+            await conn.execute(
+                "INSERT INTO economy (id, money) VALUES (:account, :default) ON CONFLICT(id) DO NOTHING;",
+                {"account": account, "default": 20},
+            )
+            account_row = await conn.fetchone(
+                "SELECT money FROM economy WHERE id = :account;", {"account": account}
+            )
+            return account_row[0]
 
 
 class Economy(subclasses.Cog):
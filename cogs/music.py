@@ -126,12 +126,9 @@ class Music(subclasses.Cog):
     async def on_wavelink_track_start(
         self, payload: wavelink.TrackStartEventPayload
     ) -> None:
-        async with self.bot.pool.acquire() as conn:
-            is_silent: bool = await conn.fetchone(
-                "SELECT value FROM guildConfig WHERE id = ? AND key = 'silent';",
-                (payload.player.guild.id),
-            )
+        is_silent: bool = await self.get_setting(payload.player.guild.id, "silent")
 
+        async with self.bot.pool.acquire() as conn:
             # +1 song played
             await conn.execute(
                 "INSERT INTO statistics (id, key, value) VALUES (?, ?, 1) ON CONFLICT(id, key) DO UPDATE SET value = value + 1;",
@@ -433,21 +430,10 @@ class Music(subclasses.Cog):
     async def shutup(self, ctx: commands.Context):
         """Makes the bot stop announcing every song
         Preferably use `nowplaying` to see what the bot is singing"""
-        async with self.bot.pool.acquire() as conn:
-            is_silent = await conn.fetchone(
-                "SELECT value FROM guildConfig WHERE id = ? AND key = 'silent';",
-                (ctx.guild.id),
-            )
-
-            if is_silent:
-                await conn.execute("DELETE FROM guildConfig WHERE key = 'silent';")
-            else:
-                await conn.execute(
-                    "INSERT INTO guildConfig (id, key, value) VALUES (:id, 'silent', :value);",
-                    {"id": ctx.guild.id, "value": True},
-                )
-
-            await conn.commit()
+        is_silent: bool = await self.get_setting(ctx.guild.id, "silent")
+        await self.bot.guild_config.set(
+            ctx.guild.id, f"{self.qualified_name}:silent", None if is_silent else True
+        )
 
         if not ctx.interaction:
             if not is_silent:
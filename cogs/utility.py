@@ -3,11 +3,12 @@ import re
 import string
 import textwrap
 import unicodedata
-from typing import TYPE_CHECKING, Literal, Optional
+from typing import TYPE_CHECKING, Annotated, Literal, Optional
 
 import discord
 from discord import app_commands
 from discord.ext import commands
+from tabulate import tabulate
 
 from ext import embedbuilder, info, rtfm
 from utils import misc, subclasses
@@ -90,26 +91,130 @@ class Utility(subclasses.Cog):
     async def rtfm(
         self,
         ctx: commands.Context,
-        source: Optional[Literal[tuple(rtfm.literal_rtfm)]] = ("stable"),  # type: ignore
+        source: Optional[Annotated[rtfm.Source, rtfm.SourceConverter]] = None,
         obj: str = None,
     ):
         """Read The Fucking Manual
         Will fetch discord.py docs for the specifed object"""
-        for src, _ in rtfm.RTFM_PAGES.items():
-            if source in src:
-                await rtfm.do_rtfm(ctx, key=src, obj=obj)
+        source = source or rtfm.Source("stable", rtfm.RTFM_PAGES["stable"])
+        await rtfm.do_rtfm(ctx, source, obj=obj)
 
     @rtfm.autocomplete("source")
     async def rtfm_autocomplete(self, interaction: discord.Interaction, current: str):
+        sources = await self.bot.rtfm.available(interaction.guild_id)
         return sorted(
             [
-                app_commands.Choice(name=source[0].capitalize(), value=source)
-                for source, _ in rtfm.RTFM_PAGES.items()
-                if current.casefold() in source or len(current) == 0
+                app_commands.Choice(name=source.title, value=name)
+                for name, source in sources.items()
+                if current.casefold() in name or len(current) == 0
             ],
             key=lambda c: c.name,
         )[:25]
 
+    @rtfm.autocomplete("obj")
+    async def rtfm_obj_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> list[app_commands.Choice]:
+        source = await self.bot.rtfm.resolve(
+            interaction.guild_id, interaction.namespace.source or "stable"
+        )
+        if source is None:
+            return []
+        if source.page not in rtfm.rtfm_cache:
+            # Never waited for, autocomplete has 3 seconds to answer
+            self.bot.rtfm.prefetch(source)
+            return []
+        names = await rtfm.complete(source.page, current)
+        # Longer values can not be sent back
+        return [
+            app_commands.Choice(name=name, value=name)
+            for name in names
+            if len(name) <= 100
+        ]
+
+    @commands.hybrid_group(aliases=["docs"], invoke_without_command=True)
+    async def rtfmsources(self, ctx: commands.Context):
+        """Lists the documentation sources rtfm can search here"""
+        sources = await self.bot.rtfm.available(ctx.guild and ctx.guild.id)
+        data = []
+        for name, source in sorted(sources.items()):
+            loaded = rtfm.rtfm_cache.get(source.page)
+            size = self.bot.rtfm.size(source.page)
+            data.append(
+                [
+                    name,
+                    source.scope,
+                    f"{len(loaded):,}" if loaded is not None else "-",
+                    f"{size / 1024**2:,.1f}" if size else "-",
+                ]
+            )
+
+        embed = discord.Embed(
+            title=":books: Documentation sources",
+            description=f"```\n{tabulate(data, headers=['Name', 'Scope', 'Entries', 'MB'])}```",
+            color=discord.Color.blurple(),
+        )
+        embed.set_footer(
+            text=f"{len(rtfm.rtfm_cache)} loaded • {self.bot.rtfm.used / 1024**2:,.1f}MB"
+            f" of {self.bot.rtfm.budget / 1024**2:,.0f}MB • unused ones are evicted"
+        )
+        await ctx.reply(embed=embed, mention_author=False)
+
+    @commands.guild_only()
+    @commands.has_guild_permissions(manage_guild=True)
+    @rtfmsources.command(name="add")
+    @app_commands.describe(
+        name="What to call it in rtfm",
+        url="Root of Sphinx documentation, where objects.inv is",
+        scope="Owners can add sources for every server",
+    )
+    async def rtfmsources_add(
+        self,
+        ctx: commands.Context,
+        name: str,
+        url: str,
+        scope: Literal["server", "global"] = "server",
+    ):
+        """Adds Sphinx documentation rtfm can search"""
+        if scope == "global" and not await self.bot.is_owner(ctx.author):
+            raise commands.NotOwner("Only owners can add global sources")
+
+        await ctx.typing()
+        guild_id = rtfm.GLOBAL if scope == "global" else ctx.guild.id
+        try:
+            source = await self.bot.rtfm.add(guild_id, name, url)
+        except (ValueError, RuntimeError) as e:
+            return await ctx.reply(str(e), mention_author=False, delete_after=5)
+
+        entries = len(rtfm.rtfm_cache.get(source.page, ()))
+        await ctx.reply(
+            f"Added `{source.name}` ({entries:,} objects) for {'every server' if scope == 'global' else 'this server'}",
+            mention_author=False,
+        )
+
+    @commands.guild_only()
+    @commands.has_guild_permissions(manage_guild=True)
+    @rtfmsources.command(name="remove")
+    @app_commands.describe(name="The source to remove")
+    async def rtfmsources_remove(
+        self,
+        ctx: commands.Context,
+        name: str,
+        scope: Literal["server", "global"] = "server",
+    ):
+        """Removes documentation added with rtfmsources add"""
+        if scope == "global" and not await self.bot.is_owner(ctx.author):
+            raise commands.NotOwner("Only owners can remove global sources")
+
+        guild_id = rtfm.GLOBAL if scope == "global" else ctx.guild.id
+        if not await self.bot.rtfm.remove(guild_id, name):
+            return await ctx.reply(
+                f"No {scope} source called `{name}`",
+                mention_author=False,
+                delete_after=5,
+            )
+        await ctx.reply(f"Removed `{name.casefold()}`", mention_author=False)
+
     @commands.hybrid_command(
         name="info", aliases=["stats", "about"], invoke_without_command=True
     )
@@ -135,25 +240,25 @@ class Utility(subclasses.Cog):
         """Runs code in the specified language, aliases work too !"""
 
         # Get language
-        if language not in misc.literal_runtimes:
+        runtime = self.bot.runtimes.get(language) if language else None
+        if runtime is None:
             language = (
                 language + " " if language else ""
             )  # Fix language being none in some cases
             body = language + body
-            language = "python"
+            runtime = self.bot.runtimes.get("python")
+
+        if runtime is None:
+            return await ctx.reply(
+                "Runtimes are not available yet, try again later.",
+                mention_author=False,
+                delete_after=5,
+            )
+        language = runtime
 
         # Clean body
         body = misc.clean_codeblock(body)
 
-        # Convert language
-        for r in misc.runtimes:
-            if (
-                language.casefold() == r["language"]
-                or language.casefold() in r["aliases"]
-            ):
-                language = r
-                break
-
         # Format code if python
         if language["language"] == "python":
             code = "import asyncio\nasync def func():\n"
@@ -222,12 +327,12 @@ class Utility(subclasses.Cog):
 
     @_eval.autocomplete("language")
     async def eval_autocomplete(self, interaction: discord.Interaction, current: str):
-        # Avoid repetition
-        names = set(
-            r["language"]
-            for r in misc.runtimes
-            if current.casefold() in r["language"] or len(current) == 0
-        )
+        # One entry per language
+        names = [
+            n
+            for n in self.bot.runtimes.languages
+            if current.casefold() in n or len(current) == 0
+        ]
         return sorted(
             [app_commands.Choice(name=n.capitalize(), value=n) for n in names],
             key=lambda c: c.name,
@@ -241,6 +346,13 @@ class Utility(subclasses.Cog):
             description=f">>> WS: `{round(self.bot.latency * 1000)}ms`",
             color=discord.Color.blurple(),
         )
+        if isinstance(self.bot, commands.AutoShardedBot):
+            embed.add_field(
+                name="Shards",
+                value=info.shard_latencies(
+                    self.bot, ctx.guild.shard_id if ctx.guild else 0
+                ),
+            )
         return await ctx.reply(embed=embed, mention_author=False)
 
     @commands.hybrid_command()
@@ -0,0 +1,165 @@
+import asyncio
+import itertools
+import logging
+import threading
+from multiprocessing.connection import Connection
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from main import AceBot
+
+LOGGER = logging.getLogger("discord.ace.cluster")
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+def shard_ranges(shard_count: int, clusters: int) -> List[List[int]]:
+    """Splits shards into contiguous ranges, one per cluster"""
+    per_cluster, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for i in range(clusters):
+        end = start + per_cluster + (i < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class Cluster:
+    """IPC endpoint of a worker process started by launcher.py
+
+    Messages are dicts sent over a multiprocessing pipe, the launcher relays
+    every broadcast to all clusters and routes the replies back."""
+
+    def __init__(
+        self, id: int, clusters: int, shard_ids: List[int], conn: Connection
+    ) -> None:
+        self.id = id
+        self.clusters = clusters
+        self.shard_ids = shard_ids
+        self.conn = conn
+
+        self.handlers: Dict[str, Handler] = {}
+        self.on_disconnect: Optional[Callable[[], Awaitable[None]]] = None
+
+        self._nonce = itertools.count()
+        self._waiters: Dict[int, asyncio.Queue] = {}
+        self._loop: asyncio.AbstractEventLoop
+        self._reader: Optional[threading.Thread] = None
+
+    def handler(self, name: str) -> Callable[[Handler], Handler]:
+        def decorator(func: Handler) -> Handler:
+            self.handlers[name] = func
+            return func
+
+        return decorator
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._reader = threading.Thread(
+            target=self._read, name=f"cluster-{self.id}-ipc", daemon=True
+        )
+        self._reader.start()
+
+    def _read(self) -> None:
+        # Blocking reads live on their own thread, handled on the loop
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                self._loop.call_soon_threadsafe(self._disconnected)
+                return
+            self._loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _disconnected(self) -> None:
+        LOGGER.warning("Cluster %d lost its connection to the launcher", self.id)
+        if self.on_disconnect is not None:
+            asyncio.create_task(self.on_disconnect())
+
+    def _dispatch(self, message: Dict[str, Any]) -> None:
+        match message["op"]:
+            case "command":
+                asyncio.create_task(self._run(message))
+            case "reply":
+                queue = self._waiters.get(message["nonce"])
+                if queue is not None:
+                    queue.put_nowait(message)
+
+    async def _run(self, message: Dict[str, Any]) -> None:
+        reply = {
+            "op": "reply",
+            "nonce": message["nonce"],
+            "origin": message["origin"],
+            "cluster": self.id,
+            "data": None,
+            "error": None,
+        }
+        handler = self.handlers.get(message["command"])
+        try:
+            if handler is None:
+                raise LookupError(f"Unknown command {message['command']!r}")
+            reply["data"] = await handler(**message["payload"])
+        except Exception as e:
+            LOGGER.error("Cluster command %s failed", message["command"], exc_info=1)
+            reply["error"] = f"{type(e).__qualname__}: {e}"
+
+        self.conn.send(reply)
+
+    async def broadcast(
+        self, command: str, *, timeout: float = 10.0, **payload: Any
+    ) -> List[Dict[str, Any]]:
+        """Runs `command` on every cluster, this one included.
+
+        Returns the replies sorted by cluster id, clusters that did not answer
+        within `timeout` are missing from the result."""
+        nonce = next(self._nonce)
+        queue: asyncio.Queue = asyncio.Queue()
+        self._waiters[nonce] = queue
+
+        replies: List[Dict[str, Any]] = []
+        try:
+            self.conn.send(
+                {
+                    "op": "broadcast",
+                    "nonce": nonce,
+                    "origin": self.id,
+                    "command": command,
+                    "payload": payload,
+                }
+            )
+            async with asyncio.timeout(timeout):
+                while len(replies) < self.clusters:
+                    replies.append(await queue.get())
+        except TimeoutError:
+            LOGGER.warning(
+                "%s: %d/%d clusters replied", command, len(replies), self.clusters
+            )
+        finally:
+            del self._waiters[nonce]
+
+        return sorted(replies, key=lambda r: r["cluster"])
+
+
+def register_handlers(cluster: Cluster, bot: "AceBot") -> None:
+    """Cross-cluster commands every worker answers to"""
+
+    @cluster.handler("stats")
+    async def stats() -> Dict[str, Any]:
+        return {
+            "cluster": cluster.id,
+            "shards": cluster.shard_ids,
+            "guilds": len(bot.guilds),
+            "users": len(bot.users),
+            "latency": bot.latency,
+        }
+
+    @cluster.handler("evict_config")
+    async def evict_config(guild_id: int) -> None:
+        bot.guild_config.evict(guild_id)
+
+    @cluster.handler("reload")
+    async def reload() -> List[str]:
+        reloaded = []
+        for ext in list(bot.extensions):
+            await bot.reload_extension(ext)
+            reloaded.append(ext)
+        return reloaded
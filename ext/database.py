@@ -0,0 +1,110 @@
+import logging
+import sqlite3
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    import asqlite
+
+LOGGER = logging.getLogger("discord.ace.database")
+
+# Applied to every pooled connection, overridable from config.json
+# e.g. {"database": {"pool_size": 4, "pragmas": {"mmap_size": 0}}}
+PRAGMAS: Dict[str, Any] = {
+    "journal_mode": "wal",  # Readers don't block on writers
+    "synchronous": "normal",  # fsync on checkpoint only, safe with WAL
+    "mmap_size": 256 * 1024**2,
+    "cache_size": -64 * 1024,  # Negative is in KiB
+    "temp_store": "memory",
+    "busy_timeout": 5000,  # ms
+}
+POOL_SIZE = 10
+
+# Ordered schema migrations, (version, statements)
+# Never edit a released step, append a new one instead
+MIGRATIONS: List[Tuple[int, List[str]]] = [
+    # Base tables, existing databases already have them
+    (
+        1,
+        [
+            "CREATE TABLE IF NOT EXISTS economy ( id INTEGER NOT NULL, money INTEGER DEFAULT (0));",
+            "CREATE TABLE IF NOT EXISTS guildConfig ( id INTEGER DEFAULT (0), key TEXT NOT NULL, value BLOB, PRIMARY KEY(id, key));",
+            "CREATE TABLE IF NOT EXISTS statistics (id INTEGER DEFAULT (0), key TEXT NOT NULL, value INTEGER DEFAULT (0), PRIMARY KEY(id, key));",
+        ],
+    ),
+    # Primary key on economy.id, duplicated accounts keep their highest balance
+    (
+        2,
+        [
+            "CREATE TABLE economy_new ( id INTEGER PRIMARY KEY NOT NULL, money INTEGER DEFAULT (0));",
+            "INSERT INTO economy_new (id, money) SELECT id, MAX(money) FROM economy GROUP BY id;",
+            "DROP TABLE economy;",
+            "ALTER TABLE economy_new RENAME TO economy;",
+        ],
+    ),
+    # Covering indexes for leaderboards and per-guild aggregates
+    (
+        3,
+        [
+            "CREATE INDEX IF NOT EXISTS statistics_key_value ON statistics (key, value);",
+            "CREATE INDEX IF NOT EXISTS statistics_id_key ON statistics (id, key, value);",
+        ],
+    ),
+    # Music:silent was stored as a bare key by the shutup command, the bare
+    # key is the one that was read so it wins over a Music:silent row
+    (
+        4,
+        [
+            "DELETE FROM guildConfig WHERE key = 'Music:silent' AND id IN (SELECT id FROM guildConfig WHERE key = 'silent');",
+            "UPDATE guildConfig SET key = 'Music:silent' WHERE key = 'silent';",
+        ],
+    ),
+]
+
+
+def pragma_profile(overrides: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    profile = {**PRAGMAS, **(overrides or {})}
+    for name, value in profile.items():
+        if not name.isidentifier() or not isinstance(value, (int, str)):
+            raise ValueError(f"Invalid pragma {name!r} = {value!r}")
+    return profile
+
+
+def apply_pragmas(
+    profile: Dict[str, Any]
+) -> Callable[[sqlite3.Connection], None]:
+    """Returns an `init` callback for `asqlite.create_pool`"""
+
+    def init(conn: sqlite3.Connection) -> None:
+        for name, value in profile.items():
+            conn.execute(f"PRAGMA {name} = {value};")
+
+    return init
+
+
+async def schema_version(conn: "asqlite.Connection") -> int:
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL);"
+    )
+    row = await conn.fetchone("SELECT max(version) FROM schema_version;")
+    return row[0] or 0
+
+
+async def migrate(pool: "asqlite.Pool") -> int:
+    """Upgrades the database in place, returns the resulting schema version"""
+    async with pool.acquire() as conn:
+        version = await schema_version(conn)
+
+        for step, statements in MIGRATIONS:
+            if step <= version:
+                continue
+
+            LOGGER.info("Migrating database from version %d to %d", version, step)
+            async with conn.transaction():
+                for statement in statements:
+                    await conn.execute(statement)
+                await conn.execute(
+                    "INSERT INTO schema_version (version) VALUES (?);", (step,)
+                )
+            version = step
+
+        return version
@@ -0,0 +1,84 @@
+import time
+from typing import Dict, List, Tuple
+
+BUCKET = 10  # seconds
+SIZE = 360  # An hour of buckets
+
+WINDOWS = (60, 300, 3600)
+
+
+class RollingCounter:
+    """Per-10s buckets over the last hour, O(1) per increment"""
+
+    __slots__ = ("buckets", "epoch")
+
+    def __init__(self, epoch: int) -> None:
+        self.buckets: List[int] = [0] * SIZE
+        self.epoch = epoch
+
+    def advance(self, epoch: int) -> None:
+        if epoch <= self.epoch:
+            return
+        for i in range(self.epoch + 1, min(epoch, self.epoch + SIZE) + 1):
+            self.buckets[i % SIZE] = 0
+        self.epoch = epoch
+
+    def add(self, epoch: int) -> None:
+        if epoch != self.epoch:
+            self.advance(epoch)
+        self.buckets[epoch % SIZE] += 1
+
+    def rate(self, seconds: int, now: float, uptime: float) -> float:
+        """Events per second over the last `seconds`, or the uptime if shorter"""
+        epoch = int(now) // BUCKET
+        self.advance(epoch)
+        amount = min(seconds // BUCKET, SIZE)
+        count = sum(self.buckets[(epoch - i) % SIZE] for i in range(amount))
+        # The current bucket is only partially filled
+        elapsed = min((amount - 1) * BUCKET + (now - epoch * BUCKET), uptime)
+        return count / elapsed if elapsed > 0 else 0.0
+
+
+class GatewayStats:
+    """Gateway event rates fed by socket_event_type, and time spent in listeners"""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.events: Dict[str, RollingCounter] = {}
+        self.totals: Dict[str, int] = {}
+
+        # Event name -> [calls, total seconds, max seconds]
+        self.listeners: Dict[str, List[float]] = {}
+
+    def event(self, event_type: str) -> None:
+        epoch = int(time.monotonic()) // BUCKET
+        counter = self.events.get(event_type)
+        if counter is None:
+            counter = self.events[event_type] = RollingCounter(epoch)
+            self.totals[event_type] = 0
+        counter.add(epoch)
+        self.totals[event_type] += 1
+
+    def listener(self, event_name: str, seconds: float) -> None:
+        stats = self.listeners.get(event_name)
+        if stats is None:
+            self.listeners[event_name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+    def rates(self) -> List[Tuple[str, int, Tuple[float, ...]]]:
+        """(event type, total, rates per window) sorted by the 5 minute rate"""
+        now = time.monotonic()
+        uptime = now - self.started
+        rows = [
+            (
+                event_type,
+                self.totals[event_type],
+                tuple(counter.rate(window, now, uptime) for window in WINDOWS),
+            )
+            for event_type, counter in self.events.items()
+        ]
+        return sorted(rows, key=lambda r: r[2][1], reverse=True)
@@ -0,0 +1,120 @@
+import asyncio
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict
+
+if TYPE_CHECKING:
+    from main import AceBot
+
+
+class GuildConfig:
+    """Write-through LRU cache over the guildConfig table.
+
+    A guild's keys are all loaded in one query the first time it is used,
+    the least recently used guilds are dropped past `capacity`."""
+
+    def __init__(self, bot: "AceBot", capacity: int = 1000) -> None:
+        self.bot = bot
+        self.capacity = capacity
+
+        self._cache: OrderedDict[int, Dict[str, Any]] = OrderedDict()
+        self._loading: Dict[int, asyncio.Future] = {}
+        # Writes made while their guild was loading, applied to what it loaded
+        self._writes: Dict[int, Dict[str, Any]] = {}
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def _load(self, guild_id: int) -> Dict[str, Any]:
+        async with self.bot.pool.acquire() as conn:
+            rows = await conn.fetchall(
+                "SELECT key, value FROM guildConfig WHERE id = ?;", (guild_id,)
+            )
+        return {row[0]: row[1] for row in rows}
+
+    async def fetch(self, guild_id: int) -> Dict[str, Any]:
+        """Returns every key set for the guild, do not mutate the result"""
+        if guild_id in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(guild_id)
+            return self._cache[guild_id]
+
+        self.misses += 1
+
+        # Share a single query between concurrent misses
+        if guild_id in self._loading:
+            try:
+                return await asyncio.shield(self._loading[guild_id])
+            except asyncio.CancelledError:
+                # The caller loading it was cancelled rather than this one
+                if asyncio.current_task().cancelling():
+                    raise
+                return await self.fetch(guild_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[guild_id] = future
+        try:
+            config = await self._load(guild_id)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved
+            raise
+        except BaseException:
+            # Cancelled, the callers sharing this load must not wait forever
+            future.cancel()
+            raise
+        finally:
+            del self._loading[guild_id]
+            writes = self._writes.pop(guild_id, {})
+
+        # The query may have read the table before these writes
+        for key, value in writes.items():
+            self._apply(config, key, value)
+
+        self._cache[guild_id] = config
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+        future.set_result(config)
+        return config
+
+    async def get(self, guild_id: int, key: str, default: Any = None) -> Any:
+        return (await self.fetch(guild_id)).get(key, default)
+
+    async def set(self, guild_id: int, key: str, value: Any) -> None:
+        """Writes the value through to the database, `None` removes the key"""
+        async with self.bot.pool.acquire() as conn:
+            if value is None:
+                await conn.execute(
+                    "DELETE FROM guildConfig WHERE key = :key AND id = :id;",
+                    {"key": key, "id": guild_id},
+                )
+            else:
+                await conn.execute(
+                    "INSERT INTO guildConfig (id, key, value) VALUES (:id, :key, :value) ON CONFLICT(id, key) DO UPDATE SET value = :value;",
+                    {"id": guild_id, "key": key, "value": value},
+                )
+
+        # Only update guilds already cached or loading, others load on next use
+        config = self._cache.get(guild_id)
+        if config is not None:
+            self._apply(config, key, value)
+        elif guild_id in self._loading:
+            self._writes.setdefault(guild_id, {})[key] = value
+
+    @staticmethod
+    def _apply(config: Dict[str, Any], key: str, value: Any) -> None:
+        if value is None:
+            config.pop(key, None)
+        else:
+            config[key] = value
+
+    def evict(self, guild_id: int) -> None:
+        self._cache.pop(guild_id, None)
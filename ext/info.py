@@ -1,3 +1,4 @@
+import logging
 import pathlib
 import time
 from typing import TYPE_CHECKING, List, Optional
@@ -11,6 +12,8 @@ from utils import misc, subclasses, errors
 if TYPE_CHECKING:
     from main import AceBot
 
+LOGGER = logging.getLogger("discord.ace.info")
+
 
 class Info:
     def __init__(self, bot: "AceBot") -> None:
@@ -27,12 +30,8 @@ class Info:
         self.users = len(self.bot.users)
         self.guilds = len(self.bot.guilds)
 
-        # Process stats
-        process = psutil.Process()
-        self.pid = process.pid
-        self.memory = process.memory_full_info().rss / 1024**2
-        self.memory100 = process.memory_percent()
-        self.cpu100 = process.cpu_percent()
+        # Live process stats come from `bot.resources`
+        self.pid = psutil.Process().pid
 
         # Global stats
         self.commands_ran: int = 0
@@ -44,10 +43,18 @@ class Info:
         self._total_lines()
 
     async def stats(self, embed: discord.Embed, guild: Optional[discord.Guild] = None):
+        # Write buffered increments first so totals are up to date
+        try:
+            await self.bot.statistics.flush()
+        except Exception:
+            # Kept buffered, the persisted totals are shown meanwhile
+            LOGGER.error("Failed to flush statistics", exc_info=1)
+
+        # Range on key instead of LIKE so the statistics indexes are used
         async with self.bot.pool.acquire() as conn:
             self.commands_ran = (
                 await conn.fetchone(
-                    "SELECT total(value) FROM statistics WHERE key LIKE 'CMD_RAN:%';"
+                    "SELECT total(value) FROM statistics WHERE key >= 'CMD_RAN:' AND key < 'CMD_RAN;';"
                 )
             )[0]
             self.songs_played = (
@@ -63,13 +70,13 @@ class Info:
 
             # TOP COMMANDS
             self.top_commands = await conn.fetchall(
-                "SELECT key, value FROM statistics WHERE key LIKE 'CMD_RAN:%' AND id = ? ORDER BY value DESC LIMIT 5;",
+                "SELECT key, value FROM statistics WHERE key >= 'CMD_RAN:' AND key < 'CMD_RAN;' AND id = ? ORDER BY value DESC LIMIT 5;",
                 (guild.id or 0),
             )
 
             local_commands_ran = (
                 await conn.fetchone(
-                    "SELECT total(value) FROM statistics WHERE key LIKE 'CMD_RAN:%' AND id = ?;",
+                    "SELECT total(value) FROM statistics WHERE key >= 'CMD_RAN:' AND key < 'CMD_RAN;' AND id = ?;",
                     (guild.id if guild else 0),
                 )
             )[0]
@@ -139,6 +146,47 @@ class Info:
         return
 
 
+def shard_latencies(
+    bot: "AceBot", current: Optional[int] = None, limit: int = 15
+) -> str:
+    """Formats per-shard latency, `current` is highlighted"""
+    latencies = sorted(bot.latencies)
+    lines = [
+        f"{misc.space}{'**' if shard == current else ''}#{shard}{'**' if shard == current else ''}: `{latency * 1000:.0f}ms`"
+        for shard, latency in latencies[:limit]
+    ]
+    if len(latencies) > limit:
+        lines.append(f"{misc.space}{misc.curve} and `{len(latencies) - limit}` more")
+    return "\n".join(lines)
+
+
+def process_stats(bot: "AceBot") -> str:
+    """Current resource usage, with min/avg/max over the last hour"""
+    current = bot.resources.current
+    if current is None:
+        return f"{misc.space}cpu & mem: `sampling...`"
+
+    summary = bot.resources.summary(3600)
+
+    def line(name: str, metric: str, fmt: str, unit: str = "") -> str:
+        low, mean, high = summary[metric]
+        return (
+            f"{misc.space}{name}: `{getattr(current, metric):{fmt}}{unit}` "
+            f"(`{low:{fmt}}`/`{mean:{fmt}}`/`{high:{fmt}}`)"
+        )
+
+    return "\n".join(
+        [
+            line("cpu", "cpu", ".1f", "%"),
+            line("mem", "rss", ",.1f", "MB"),
+            line("fds", "fds", ".0f"),
+            line("threads", "threads", ".0f"),
+            line("tasks", "tasks", ".0f"),
+            f"{misc.space}{misc.curve} min/avg/max over the last hour",
+        ]
+    )
+
+
 class InfoView(subclasses.View):
     def __init__(self, bot: "AceBot", author: discord.abc.User) -> None:
         super().__init__()
@@ -152,6 +200,13 @@ class InfoView(subclasses.View):
     async def embed(self, ctx: commands.Context):
         info: Info = self.bot.info
         assert self.bot.user is not None
+
+        # Global counts when running over multiple clusters
+        guilds, users = info.guilds, info.users
+        if self.bot.cluster:
+            replies = await self.bot.cluster.broadcast("stats", timeout=3)
+            guilds = sum(r["data"]["guilds"] for r in replies if r["data"])
+            users = sum(r["data"]["users"] for r in replies if r["data"])
         # METHOD CHAINING!!!
         embed = (
             discord.Embed(color=discord.Color.blurple())
@@ -167,8 +222,13 @@ class InfoView(subclasses.View):
             .add_field(
                 name="Community",
                 value=(
-                    f"{misc.space}{misc.server}servers: `{info.guilds}`\n"
-                    f"{misc.space}{misc.members}users: `{info.users:,}`"
+                    f"{misc.space}{misc.server}servers: `{guilds}`\n"
+                    f"{misc.space}{misc.members}users: `{users:,}`"
+                    + (
+                        f"\n{misc.space}cluster: `{self.bot.cluster.id + 1}/{self.bot.cluster.clusters}`"
+                        if self.bot.cluster
+                        else ""
+                    )
                 ),
             )
             .add_field(
@@ -192,11 +252,22 @@ class InfoView(subclasses.View):
                 name="Process",
                 value=(
                     f"{misc.space}pid: `{info.pid}`\n"
-                    f"{misc.space}cpu: `{info.cpu100:.1f}%`\n"
-                    f"{misc.space}mem: `{info.memory:,.1f}MB` (`{info.memory100:.1f}%`)"
+                    f"{process_stats(self.bot)}\n"
+                    f"{misc.space}pending writes: `{self.bot.statistics.pending}`\n"
+                    f"{misc.space}config cache: `{self.bot.guild_config.hit_rate:.1%}` hits\n"
+                    f"{misc.space}loop lag: `{self.bot.watchdog.percentile(50) * 1000:.1f}ms` (p99 `{self.bot.watchdog.percentile(99) * 1000:.1f}ms`)"
                 ),
             )
         )
+
+        if isinstance(self.bot, commands.AutoShardedBot):
+            embed.add_field(
+                name=f"Shards ({len(self.bot.shards)})",
+                value=shard_latencies(
+                    self.bot, ctx.guild.shard_id if ctx.guild else None
+                ),
+            )
+
         return await self.bot.info.stats(embed, ctx.guild)
 
     @discord.ui.button(label="Refresh")
@@ -0,0 +1,83 @@
+import bisect
+import math
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from utils.subclasses import Context
+
+# Upper bounds in ms, the last bucket catches everything slower
+BUCKETS: Sequence[float] = (
+    1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, math.inf
+)  # fmt: skip
+
+# parse: prefix & context, checks: checks, cooldowns, converters and command hooks
+# hooks: cog_before_invoke onwards, callback: minus time spent replying
+PHASES = ("parse", "checks", "hooks", "callback", "reply", "total")
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, constant memory per command"""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * len(BUCKETS)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+    def record(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, p: float) -> float:
+        """Estimated by linear interpolation inside the matching bucket"""
+        if self.count == 0:
+            return 0.0
+
+        rank = p / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = BUCKETS[i - 1] if i else 0.0
+                high = min(BUCKETS[i], self.max)
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.max
+
+
+class CommandLatency:
+    def __init__(self) -> None:
+        # Qualified name -> phase -> histogram
+        self.commands: Dict[str, Dict[str, Histogram]] = {}
+
+    def record(self, ctx: "Context") -> None:
+        if ctx.command is None or "start" not in ctx.timings:
+            return
+
+        t = ctx.timings
+        end = t.get("completed") or t.get("after_invoke")
+        if end is None:
+            return
+
+        before = t.get("before_invoke", end)
+        hooks = t.get("cog_before_invoke", before)
+        phases = {
+            "parse": t.get("parsed", t["start"]) - t["start"],
+            "checks": hooks - t.get("invoke", t.get("parsed", t["start"])),
+            "hooks": before - hooks,
+            "callback": max(t.get("after_invoke", end) - before - ctx.reply_time, 0.0),
+            "reply": ctx.reply_time,
+            "total": end - t["start"],
+        }
+
+        histograms = self.commands.setdefault(
+            ctx.command.qualified_name, {phase: Histogram() for phase in PHASES}
+        )
+        for phase, seconds in phases.items():
+            histograms[phase].record(seconds * 1000)
+
+    def get(self, command: str) -> Optional[Dict[str, Histogram]]:
+        return self.commands.get(command)
@@ -0,0 +1,175 @@
+import gc
+import linecache
+import sys
+import time
+import tracemalloc
+import types
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import aiohttp
+import discord
+import discord.state
+import wavelink
+from discord.ext import commands
+
+from ext.embedbuilder import EmbedBuilder
+from games.countryguessr import Country
+from games.game import Game
+from utils import subclasses
+from utils.paginator import Paginator
+
+# Counted by the census, most specific first
+TRACKED: Dict[str, type] = {
+    "Paginator": Paginator,
+    "EmbedBuilder": EmbedBuilder,
+    "View": subclasses.View,
+    "ui.View": discord.ui.View,
+    "Game": Game,
+    "Country": Country,
+    "wavelink.Player": wavelink.Player,
+    "wavelink.Playable": wavelink.Playable,
+}
+
+# Reachable from almost everything, never part of what an instance retains
+SHARED: Tuple[type, ...] = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.CodeType,
+    types.FrameType,
+    discord.Client,
+    discord.state.ConnectionState,
+    discord.Guild,
+    discord.user.BaseUser,
+    discord.Member,
+    discord.Role,
+    discord.abc.GuildChannel,
+    discord.abc.PrivateChannel,
+    discord.Thread,
+    commands.Cog,
+    commands.Command,
+    aiohttp.ClientSession,
+)
+
+# Objects walked per instance, bounds the census on runaway graphs
+WALK_LIMIT = 50_000
+
+
+@dataclass
+class CensusEntry:
+    category: str
+    instances: int = 0
+    retained: int = 0  # Bytes, see `census`
+
+
+def _retained(
+    root: object, roots: Set[int], seen: Set[int], limit: int = WALK_LIMIT
+) -> int:
+    size = 0
+    stack = [root]
+    while stack and limit:
+        obj = stack.pop()
+        key = id(obj)
+        if key in seen or isinstance(obj, SHARED) or (key in roots and obj is not root):
+            continue
+        seen.add(key)
+        size += sys.getsizeof(obj)
+        limit -= 1
+        stack.extend(gc.get_referents(obj))
+    return size
+
+
+def census() -> Dict[str, CensusEntry]:
+    """Live instances of the tracked classes by concrete type.
+
+    An instance retains what it references, minus shared objects (the bot,
+    guilds, users...) and other tracked instances. Objects referenced by
+    several instances are attributed to the first one walked. Blocking, run
+    it in a thread."""
+    bases = tuple(TRACKED.values())
+    instances = [obj for obj in gc.get_objects() if isinstance(obj, bases)]
+    roots = {id(obj) for obj in instances}
+    seen: Set[int] = set()
+
+    entries: Dict[str, CensusEntry] = {}
+    for obj in instances:
+        cls = type(obj)
+        entry = entries.get(cls.__qualname__)
+        if entry is None:
+            category = next(n for n, base in TRACKED.items() if isinstance(obj, base))
+            entry = entries[cls.__qualname__] = CensusEntry(category)
+        entry.instances += 1
+        entry.retained += _retained(obj, roots, seen)
+    return entries
+
+
+@dataclass
+class AllocationDiff:
+    location: str  # file:line
+    line: str
+    size: int  # Bytes
+    size_diff: int
+    count_diff: int
+
+
+class Tracer:
+    """tracemalloc snapshots, each diff is against the previous snapshot"""
+
+    # The tracer's own allocations
+    FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, linecache.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self) -> None:
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.taken: float = 0.0
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        """Blocking, run it in a thread"""
+        if not self.tracing:
+            tracemalloc.start(frames)
+        self._take()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.snapshot = None
+
+    def _take(self) -> Optional[tracemalloc.Snapshot]:
+        previous = self.snapshot
+        self.snapshot = tracemalloc.take_snapshot().filter_traces(self.FILTERS)
+        self.taken = time.time()
+        return previous
+
+    def diff(self, limit: int = 10) -> List[AllocationDiff]:
+        """Biggest growth by file and line since the last snapshot.
+        Blocking, run it in a thread"""
+        previous = self._take()
+        if previous is None:
+            # Started before a reload, this snapshot is the new baseline
+            return []
+        stats = self.snapshot.compare_to(previous, "lineno")
+        stats.sort(key=lambda s: abs(s.size_diff), reverse=True)
+
+        diffs = []
+        for stat in stats[:limit]:
+            frame = stat.traceback[0]
+            diffs.append(
+                AllocationDiff(
+                    location=f"{frame.filename}:{frame.lineno}",
+                    line=linecache.getline(frame.filename, frame.lineno).strip(),
+                    size=stat.size,
+                    size_diff=stat.size_diff,
+                    count_diff=stat.count_diff,
+                )
+            )
+        return diffs
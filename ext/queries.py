@@ -0,0 +1,175 @@
+import contextlib
+import functools
+import logging
+import re
+import sqlite3
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from ext.latency import Histogram
+
+if TYPE_CHECKING:
+    import asqlite
+
+LOGGER = logging.getLogger("discord.ace.queries")
+
+_SPACES = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+
+# Only these can be explained
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+OTHER = "<other>"  # Past `capacity` distinct statements
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize(sql: str) -> str:
+    """Collapses whitespace, literals and IN lists so equivalent statements aggregate"""
+    sql = _SPACES.sub(" ", sql.strip()).rstrip(";")
+    sql = _LITERALS.sub("?", sql)
+    return _IN_LISTS.sub("IN (...)", sql)
+
+
+class QueryStats:
+    __slots__ = ("latency", "errors", "slow", "plan")
+
+    def __init__(self) -> None:
+        self.latency = Histogram()  # ms
+        self.errors: int = 0
+        self.slow: int = 0
+        self.plan: Optional[str] = None  # EXPLAIN QUERY PLAN, first time it was slow
+
+
+def _format_plan(rows: List[sqlite3.Row]) -> str:
+    # Rows are (id, parent, notused, detail), indent children under their parent
+    depths: Dict[int, int] = {0: -1}
+    lines = []
+    for row in rows:
+        depth = depths.get(row[1], -1) + 1
+        depths[row[0]] = depth
+        lines.append("  " * depth + row[3])
+    return "\n".join(lines) or "no plan"
+
+
+class Queries:
+    """Times every statement going through the pool, aggregated by normalized SQL"""
+
+    def __init__(self, slow_ms: float = 100.0, capacity: int = 500) -> None:
+        self.slow_ms = slow_ms
+        self.capacity = capacity
+        self.queries: Dict[str, QueryStats] = {}
+
+    def wrap(self, pool: "asqlite.Pool") -> "InstrumentedPool":
+        return InstrumentedPool(pool, self)
+
+    def get(self, sql: str) -> QueryStats:
+        key = normalize(sql)
+        stats = self.queries.get(key)
+        if stats is None:
+            if len(self.queries) >= self.capacity:
+                key = OTHER
+            stats = self.queries.setdefault(key, QueryStats())
+        return stats
+
+    def heaviest(self, amount: int = 10) -> List[Tuple[str, QueryStats]]:
+        """By total time spent"""
+        return sorted(
+            self.queries.items(), key=lambda q: q[1].latency.sum, reverse=True
+        )[:amount]
+
+
+class InstrumentedConnection:
+    """Wraps an asqlite connection, anything not timed is passed through"""
+
+    def __init__(self, conn: "asqlite.Connection", queries: Queries) -> None:
+        self._conn = conn
+        self._queries = queries
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+    async def execute(self, sql: str, /, *parameters: Any) -> "asqlite.Cursor":
+        return await self._timed(self._conn.execute, sql, parameters)
+
+    async def executemany(
+        self, sql: str, seq_of_parameters: Sequence[Any]
+    ) -> "asqlite.Cursor":
+        # Explained with the first set of parameters
+        first = seq_of_parameters[:1] if isinstance(seq_of_parameters, Sequence) else ()
+        return await self._timed(
+            self._conn.executemany, sql, (seq_of_parameters,), explain=tuple(first)
+        )
+
+    async def fetchone(self, query: str, /, *parameters: Any) -> sqlite3.Row:
+        return await self._timed(self._conn.fetchone, query, parameters)
+
+    async def fetchmany(
+        self, query: str, /, *parameters: Any, size: Optional[int] = None
+    ) -> List[sqlite3.Row]:
+        return await self._timed(self._conn.fetchmany, query, parameters, size=size)
+
+    async def fetchall(self, query: str, /, *parameters: Any) -> List[sqlite3.Row]:
+        return await self._timed(self._conn.fetchall, query, parameters)
+
+    async def _timed(
+        self,
+        method,
+        sql: str,
+        parameters: tuple,
+        explain: Optional[tuple] = None,
+        **kwargs,
+    ):
+        stats = self._queries.get(sql)
+        start = time.perf_counter()
+        try:
+            result = await method(sql, *parameters, **kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            stats.latency.record(elapsed)
+
+        if elapsed >= self._queries.slow_ms:
+            stats.slow += 1
+            if stats.plan is None:
+                stats.plan = await self._explain(
+                    sql, parameters if explain is None else explain
+                )
+            LOGGER.warning(
+                "Slow query (%.0fms): %s\n%s", elapsed, normalize(sql), stats.plan
+            )
+        return result
+
+    async def _explain(self, sql: str, parameters: tuple) -> str:
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return "not explainable"
+        try:
+            rows = await self._conn.fetchall("EXPLAIN QUERY PLAN " + sql, *parameters)
+        except sqlite3.Error as e:
+            return f"unavailable: {e}"
+        return _format_plan(rows)
+
+
+class InstrumentedPool:
+    def __init__(self, pool: "asqlite.Pool", queries: Queries) -> None:
+        self._pool = pool
+        self.queries = queries
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[InstrumentedConnection]:
+        async with self._pool.acquire() as conn:
+            yield InstrumentedConnection(conn, self.queries)
@@ -0,0 +1,176 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import aiohttp
+
+from ext.latency import Histogram
+
+LOGGER = logging.getLogger("discord.ace.ratelimits")
+
+# Command that triggered the current requests, set by the bot on invoke
+source: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "source", default=None
+)
+
+
+@dataclass
+class RouteStats:
+    requests: int = 0
+    errors: int = 0
+    ratelimited: int = 0  # 429s
+    retry_after: float = 0.0  # Seconds spent sleeping on 429s
+    waited: float = 0.0  # Seconds held back by the bucket or 429s, off the wire
+
+    # Taken from the latest response headers
+    bucket: Optional[str] = None
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    reset_after: Optional[float] = None
+
+    def __post_init__(self) -> None:
+        self.latency = Histogram()
+
+
+@dataclass
+class RateLimitHit:
+    at: float  # Unix time
+    route: str
+    source: str
+    retry_after: float
+    scope: str  # user, global or shared
+
+
+class _Request:
+    __slots__ = ("route", "source", "wire")
+
+    def __init__(self, route: str, source: str) -> None:
+        self.route = route
+        self.source = source
+        self.wire: float = 0.0  # Time spent in actual HTTP round trips
+
+
+_current: contextvars.ContextVar[Optional[_Request]] = contextvars.ContextVar(
+    "request", default=None
+)
+
+
+def _label() -> str:
+    label = source.get()
+    if label is not None:
+        return label
+    # Listeners and views, named by discord.py
+    task = asyncio.current_task()
+    return task.get_name() if task else "unknown"
+
+
+def _float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class HTTPStats:
+    """Per route REST telemetry, fed by an aiohttp trace on discord.py's session.
+
+    Routes are keyed on discord.py's templated route key (`POST /channels/{channel_id}/messages`)
+    and every request is attributed to the command, or task, that made it."""
+
+    def __init__(self, hits: int = 50) -> None:
+        self.routes: Dict[str, RouteStats] = {}
+        # (route, source) -> [requests, 429s]
+        self.sources: Dict[Tuple[str, str], list] = {}
+        self.hits: Deque[RateLimitHit] = deque(maxlen=hits)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_request_end.append(self._on_request_end)
+        trace.on_request_exception.append(self._on_request_exception)
+        return trace
+
+    def wrap(self, request: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """Wraps HTTPClient.request to know the route and the time queued on it"""
+
+        @functools.wraps(request)
+        async def wrapper(route, **kwargs):
+            req = _Request(route.key, _label())
+            token = _current.set(req)
+            start = time.perf_counter()
+            try:
+                return await request(route, **kwargs)
+            finally:
+                _current.reset(token)
+                stats = self.routes.get(req.route)
+                if stats is not None:
+                    stats.waited += max(time.perf_counter() - start - req.wire, 0.0)
+
+        return wrapper
+
+    def _route(self, method: str, url: Any) -> Tuple[str, str]:
+        req = _current.get()
+        if req is None:
+            # CDN and anything else bypassing HTTPClient.request
+            return f"{method} {url.host}", _label()
+        return req.route, req.source
+
+    async def _on_request_start(
+        self, session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        ctx.start = time.perf_counter()
+
+    async def _on_request_exception(
+        self, session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        route, _ = self._route(params.method, params.url)
+        self.routes.setdefault(route, RouteStats()).errors += 1
+
+    async def _on_request_end(
+        self, session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+    ) -> None:
+        elapsed = time.perf_counter() - ctx.start
+        req = _current.get()
+        if req is not None:
+            req.wire += elapsed
+
+        route, label = self._route(params.method, params.url)
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = RouteStats()
+        per_source = self.sources.get((route, label))
+        if per_source is None:
+            per_source = self.sources[(route, label)] = [0, 0]
+
+        stats.requests += 1
+        per_source[0] += 1
+        stats.latency.record(elapsed * 1000)
+
+        headers = params.response.headers
+        if "X-Ratelimit-Remaining" in headers:
+            stats.bucket = headers.get("X-Ratelimit-Bucket", stats.bucket)
+            stats.limit = int(headers.get("X-Ratelimit-Limit", 0)) or stats.limit
+            stats.remaining = int(headers["X-Ratelimit-Remaining"])
+            stats.reset_after = _float(headers.get("X-Ratelimit-Reset-After"))
+
+        if params.response.status == 429:
+            retry_after = _float(headers.get("Retry-After")) or 0.0
+            stats.ratelimited += 1
+            stats.retry_after += retry_after
+            per_source[1] += 1
+            self.hits.append(
+                RateLimitHit(
+                    at=time.time(),
+                    route=route,
+                    source=label,
+                    retry_after=retry_after,
+                    scope=headers.get("X-Ratelimit-Scope", "user"),
+                )
+            )
+            LOGGER.info("429 on %s from %s, retry after %.2fs", route, label, retry_after)
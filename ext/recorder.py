@@ -0,0 +1,102 @@
+import gzip
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+LOGGER = logging.getLogger("discord.ace.recorder")
+
+FORMAT = "acebot-gateway"
+VERSION = 1
+
+
+class Recorder:
+    """Writes every raw gateway payload with its arrival time to a gzip file.
+
+    Lines are `<seconds since start>\\t<payload>`, after a JSON header line.
+    Compression and disk writes happen on a background thread, payloads are
+    dropped rather than blocking the event loop when the queue is full."""
+
+    def __init__(
+        self,
+        path: str = "gateway.jsonl.gz",
+        queue_size: int = 10_000,
+        compresslevel: int = 6,
+    ) -> None:
+        self.path = path
+        self.compresslevel = compresslevel
+        self.queue: "queue.Queue[Optional[Tuple[float, str]]]" = queue.Queue(
+            maxsize=queue_size
+        )
+        self.start_time: float = 0.0
+        self.recorded: int = 0
+        self.dropped: int = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.start_time = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, args=(time.time(),), name="gateway-recorder", daemon=True
+        )
+        self._thread.start()
+        LOGGER.info("Recording gateway payloads to %s", self.path)
+
+    def record(self, payload: str) -> None:
+        try:
+            self.queue.put_nowait((time.perf_counter() - self.start_time, payload))
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.recorded += 1
+
+    def stop(self) -> None:
+        # Drains what is left in the queue
+        if not self.running:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        LOGGER.info(
+            "Recorded %d gateway payloads (%d dropped) to %s",
+            self.recorded,
+            self.dropped,
+            self.path,
+        )
+
+    def _run(self, started: float) -> None:
+        header = {"format": FORMAT, "version": VERSION, "started": started}
+        with gzip.open(
+            self.path, "wt", encoding="utf-8", compresslevel=self.compresslevel
+        ) as file:
+            file.write(json.dumps(header) + "\n")
+            while (item := self.queue.get()) is not None:
+                offset, payload = item
+                file.write(f"{offset:.6f}\t{payload}\n")
+
+
+def read(path: str) -> Tuple[Dict[str, Any], Iterator[Tuple[float, str]]]:
+    """The header of a recording and its (offset, raw payload) pairs"""
+    file = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(file.readline())
+    if header.get("format") != FORMAT:
+        file.close()
+        raise ValueError(f"{path} is not a gateway recording")
+
+    def payloads() -> Iterator[Tuple[float, str]]:
+        with file:
+            try:
+                for line in file:
+                    offset, _, payload = line.rstrip("\n").partition("\t")
+                    yield float(offset), payload
+            except EOFError:
+                # The bot stopped without closing the file, keep what was flushed
+                pass
+
+    return header, payloads()
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, fields
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple
+
+import psutil
+
+if TYPE_CHECKING:
+    from ext.watchdog import Watchdog
+
+LOGGER = logging.getLogger("discord.ace.resources")
+
+
+@dataclass
+class Sample:
+    at: float  # Unix time
+    cpu: float  # Percent of one core since the previous sample
+    rss: float  # MB
+    fds: int  # File descriptors, handles on Windows
+    threads: int
+    tasks: int  # asyncio tasks
+    lag: float  # Worst event loop lag since the previous sample, ms
+
+
+# Summarized by `ResourceSampler.summary`
+METRICS = tuple(f.name for f in fields(Sample) if f.name != "at")
+
+
+class ResourceSampler:
+    """Samples process resources every `interval` seconds into a ring buffer"""
+
+    def __init__(
+        self,
+        watchdog: "Watchdog",
+        interval: float = 10.0,
+        samples: int = 360,  # An hour at the default interval
+    ) -> None:
+        self.watchdog = watchdog
+        self.interval = interval
+        self.samples: Deque[Sample] = deque(maxlen=samples)
+
+        self._process = psutil.Process()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def current(self) -> Optional[Sample]:
+        return self.samples[-1] if self.samples else None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            # The first cpu_percent call only sets the reference point
+            self._process.cpu_percent()
+            self._task = asyncio.create_task(self._run(), name="resource-sampler")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.samples.append(self.sample())
+            except psutil.Error:
+                LOGGER.exception("Failed to sample process resources")
+
+    def sample(self) -> Sample:
+        process = self._process
+        with process.oneshot():
+            cpu = process.cpu_percent()
+            rss = process.memory_info().rss / 1024**2
+            fds = (
+                process.num_fds()
+                if hasattr(process, "num_fds")
+                else process.num_handles()
+            )
+            threads = process.num_threads()
+
+        # Watchdog samples taken since the previous one
+        recent = math.ceil(self.interval / self.watchdog.interval)
+        lags = list(self.watchdog.lags)[-recent:]
+        return Sample(
+            at=time.time(),
+            cpu=cpu,
+            rss=rss,
+            fds=fds,
+            threads=threads,
+            tasks=len(asyncio.all_tasks()),
+            lag=max(lags, default=0.0) * 1000,
+        )
+
+    def window(self, seconds: float = 3600) -> List[Sample]:
+        since = time.time() - seconds
+        return [s for s in self.samples if s.at >= since]
+
+    def summary(self, seconds: float = 3600) -> Dict[str, Tuple[float, float, float]]:
+        """Min, avg and max of every metric over the last `seconds`"""
+        samples = self.window(seconds)
+        if not samples:
+            return {}
+        summary = {}
+        for metric in METRICS:
+            values = [getattr(s, metric) for s in samples]
+            summary[metric] = (min(values), sum(values) / len(values), max(values))
+        return summary
+
+    def export(self) -> List[Dict[str, float]]:
+        return [asdict(s) for s in self.samples]
@@ -1,34 +1,105 @@
-import difflib
+import asyncio
+import dataclasses
+import gc
 import io
+import ipaddress
+import logging
+import os
+import pathlib
+import pickle
 import re
+import sys
+import socket
 import time
 import zlib
-from typing import Dict, Generator, List, Tuple
-
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Coroutine,
+    Dict,
+    Generator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import aiohttp
 import discord
-import requests
+import yarl
 from discord.ext import commands
 
-from utils.misc import avg
+from ext import search
+
+if TYPE_CHECKING:
+    from main import AceBot
+
+LOGGER = logging.getLogger("discord.ace.rtfm")
+
+# Page -> object name -> type & location, sources not loaded or that failed are missing
+rtfm_cache: Dict[str, "Inventory"] = {}
+# Page -> search index over its rtfm_cache inventory
+_indexes: Dict[str, search.SearchIndex] = {}
+# Page -> bytes held by its inventory and index
+_sizes: Dict[str, int] = {}
+# Page -> monotonic time of its last query, the least recent is evicted first
+_used: Dict[str, float] = {}
+
+TIMEOUT = aiohttp.ClientTimeout(total=10)
+RETRY_AFTER = 60  # Seconds before a failed source is fetched again
+TTL = 24 * 3600  # Seconds before a source is revalidated
+# Bytes of objects.inv downloaded, then decompressed, Python's is 0.2MB then 2MB
+MAX_DOWNLOAD = 8 * 1024**2
+MAX_DECOMPRESSED = 64 * 1024**2
+
+# Parsed inventories, one pickle per source
+CACHE = pathlib.Path(__file__).parent.parent / ".cache" / "rtfm"
+CACHE_VERSION = 2
+
+
+@dataclasses.dataclass
+class CacheInfo:
+    fetched_at: float  # Unix time, of the last fetch or revalidation
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
 
-rtfm_cache: dict = None
 
+_info: Dict[str, CacheInfo] = {}
+
+# Page -> load or refresh in flight, shared by every query waiting on it
+_fetching: Dict[str, asyncio.Task] = {}
+_failed: Dict[str, float] = {}  # Page -> monotonic time of the failure
+
+# Built in sources, name -> page
 RTFM_PAGES = {
-    ("stable"): "https://discordpy.readthedocs.io/en/stable",
-    ("python", "py"): "https://docs.python.org/3/",
-    ("wavelink", "wl"): "https://wavelink.dev/en/latest/",
+    "stable": "https://discordpy.readthedocs.io/en/stable",
+    "python": "https://docs.python.org/3",
+    "wavelink": "https://wavelink.dev/en/latest",
 }
+ALIASES = {"py": "python", "wl": "wavelink"}
+
+# Sources added with `Sources.add` are stored in guildConfig under this prefix,
+# those added by owners for every guild under guild 0
+PREFIX = "rtfm:"
+GLOBAL = 0
+NAME = re.compile(r"[a-z0-9_-]{1,32}")
+
+# Leading namespaces queries may spell out, they are stripped from discord.py names
+NAMESPACE = re.compile(r"^(?:discord\.(?:ext\.)?)?(?:commands\.)?(.+)")
 
-literal_rtfm = set()
-for src in RTFM_PAGES.keys():
-    if isinstance(src, str):
-        literal_rtfm.add(src)
-    else:
-        literal_rtfm.update(src)
+# Autocompleted queries kept, across sources
+COMPLETIONS = 1024
+# (page, query) -> index searched and the names it found
+_completions: "OrderedDict[Tuple[str, str], Tuple[search.SearchIndex, List[str]]]" = (
+    OrderedDict()
+)
 
 
 class SphinxObjectFileReader:
     BUFFER = 16 * 1024
+    LIMIT = MAX_DECOMPRESSED
 
     def __init__(self, buffer: bytes) -> None:
         self.stream = io.BytesIO(buffer)
@@ -41,28 +112,56 @@ class SphinxObjectFileReader:
 
     def read_compressed_chunks(self) -> Generator[bytes, None, None]:
         decompressor = zlib.decompressobj()
+        remaining = self.LIMIT
         while True:
             chunk = self.stream.read(self.BUFFER)
             if len(chunk) == 0:
                 break
-            yield decompressor.decompress(chunk)
+            # Bounded, a few KB can inflate to gigabytes
+            data = decompressor.decompress(chunk, remaining + 1)
+            remaining -= len(data)
+            if remaining < 0:
+                raise ValueError(f"Inventory over {self.LIMIT:,} bytes decompressed")
+            yield data
         yield decompressor.flush()
 
     def read_compressed_lines(self) -> Generator[str, None, None]:
-        buffer = b""
+        # Only the partial line ending a chunk is carried over to the next
+        pending = b""
         for chunk in self.read_compressed_chunks():
-            buffer += chunk
-            position = buffer.find(b"\n")
-            while position != -1:
-                yield buffer[:position].decode()
-                buffer = buffer[position + 1 :]
-                position = buffer.find(b"\n")
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line.decode()
+        if pending:
+            yield pending.decode()
+
+
+class Entry(NamedTuple):
+    type: str  # Shared by every entry of that type
+    page: str  # Shared by every entry on that page, relative to the base url
+    anchor: Optional[str]  # Usually the object's name, sharing its string
+
 
+class Inventory(Dict[str, Entry]):
+    """Object name -> entry, urls are only built for the results shown"""
 
-def parse_object_inv(stream: SphinxObjectFileReader, url: str) -> dict[str, str]:
+    def __init__(self, base: str) -> None:
+        super().__init__()
+        self.base = base
+
+    def url(self, entry: Entry) -> str:
+        url = f"{self.base}/{entry.page}"
+        return url if entry.anchor is None else f"{url}#{entry.anchor}"
+
+
+def parse_object_inv(stream: SphinxObjectFileReader, url: str) -> Inventory:
     # key: URL
     # n.b.: key doesn't have `discord` or `discord.ext.commands` namespaces
-    result: dict[str, dict[str, str]] = {}
+    result = Inventory(url)
+    # Deduplicated strings, thousands of entries share a few of each
+    types: Dict[str, str] = {}
+    pages: Dict[str, str] = {}
 
     # first line is version info
     inv_version = stream.readline().rstrip()
@@ -92,83 +191,537 @@ def parse_object_inv(stream: SphinxObjectFileReader, url: str) -> dict[str, str]
         if directive == "py:module" and name in result:
             continue
 
+        type = directive.split(":")[1]
+        type = types.setdefault(type, type)
         if directive == "std:doc":
             subdirective = "label"
 
-        if location.endswith("$"):
-            location = location[:-1] + name
-
         key = name if dispname == "-" else dispname
-        prefix = f"{subdirective}:" if domain == "std" else ""
+        if domain == "std":
+            key = f"{subdirective}:{key}"
 
         if projname == "discord.py":
             key = key.replace("discord.ext.commands.", "").replace("discord.", "")
 
-        result[f"{prefix}{key}"] = {
-            "url": "/".join((url, location)),
-            "type": directive.split(":")[1],
-        }
+        page, hash, anchor = location.partition("#")
+        if anchor == "$":
+            # The object's own name, the same string as the key when unchanged
+            anchor = key if key == name else name
+        elif location.endswith("$"):
+            page, hash, anchor = (location[:-1] + name).partition("#")
+        if not hash:
+            anchor = None
+        result[key] = Entry(type, pages.setdefault(page, page), anchor)
 
     return result
 
 
-async def build_rtfm_table():
-    # Build cache
-    cache: dict[str, dict[str, dict[str, str]]] = {}
-    for key, page in RTFM_PAGES.items():
-        cache[key] = {}
-        # Get objects.inv from docs
-        with requests.get(page + "/objects.inv") as resp:
-            if resp.status_code != 200:
-                raise RuntimeError("Failed")
-
-            stream = SphinxObjectFileReader(resp.content)
-            cache[key] = parse_object_inv(stream, page)
+def _path(page: str) -> pathlib.Path:
+    # Readable, the page stored inside tells truncated names apart
+    name = re.sub(r"[^\w.-]+", "_", page.partition("://")[2]).strip("_")
+    return CACHE / f"{name[:100]}.pickle"
+
+
+def _read_cache(page: str) -> Optional[Tuple[CacheInfo, Inventory]]:
+    path = _path(page)
+    try:
+        with open(path, "rb") as file:
+            data = pickle.load(file)
+        if data.get("version") != CACHE_VERSION or data.get("page") != page:
+            return None
+        return CacheInfo(**data["info"]), data["inventory"]
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Truncated, or pickled before a class moved, it would fail every load
+        LOGGER.warning("Discarding unreadable cache %s", path, exc_info=1)
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            pass
+        return None
+
+
+def _write_cache(page: str, info: CacheInfo, inventory: Inventory) -> None:
+    path = _path(page)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "version": CACHE_VERSION,
+        "page": page,
+        "info": dataclasses.asdict(info),
+        "inventory": inventory,
+    }
+    # Written aside then renamed, a crash never leaves a truncated cache
+    temporary = path.with_suffix(".tmp")
+    with open(temporary, "wb") as file:
+        pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+async def _save(page: str, info: CacheInfo, inventory: Inventory) -> None:
+    try:
+        await asyncio.to_thread(_write_cache, page, info, inventory)
+    except OSError:
+        LOGGER.warning("Failed to cache %s inventory", page, exc_info=1)
+
+
+def _sizeof(*roots: object) -> int:
+    """Bytes held by `roots` and everything they reference, counted once"""
+    size = 0
+    seen = set()
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, type):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+
+def _index(inventory: Inventory) -> Tuple[search.SearchIndex, int]:
+    index = search.SearchIndex(inventory)
+    return index, _sizeof(inventory, index)
+
+
+def _swap(
+    page: str,
+    inventory: Inventory,
+    index: search.SearchIndex,
+    size: int,
+    info: Optional[CacheInfo],
+) -> None:
+    # Swapped in whole, queries never see a partial inventory
+    rtfm_cache[page], _indexes[page], _sizes[page] = inventory, index, size
+    if info is not None:
+        _info[page] = info
+    _used.setdefault(page, time.monotonic())
+    _forget(page)
+
+
+def _forget(page: str) -> None:
+    """Drops the autocompletions of a page, they keep its old index alive"""
+    for key in [key for key in _completions if key[0] == page]:
+        del _completions[key]
+
+
+async def _read(resp: aiohttp.ClientResponse) -> bytes:
+    """The body, raises ValueError past MAX_DOWNLOAD bytes"""
+    if (resp.content_length or 0) > MAX_DOWNLOAD:
+        raise ValueError(f"Inventory over {MAX_DOWNLOAD:,} bytes")
+    data = bytearray()
+    async for chunk in resp.content.iter_chunked(SphinxObjectFileReader.BUFFER):
+        data += chunk
+        if len(data) > MAX_DOWNLOAD:
+            raise ValueError(f"Inventory over {MAX_DOWNLOAD:,} bytes")
+    return bytes(data)
+
+
+def _check_size(page: str, size: int, budget: Optional[int]) -> None:
+    # Swapped in, it would evict every other source and still not fit
+    if budget is not None and size > budget:
+        raise ValueError(
+            f"{page} inventory holds {size / 1024**2:,.1f}MB,"
+            f" over the {budget / 1024**2:,.0f}MB budget"
+        )
 
-    global rtfm_cache
-    rtfm_cache = cache
 
+async def fetch_inventory(
+    session: aiohttp.ClientSession, page: str, budget: Optional[int] = None
+) -> Inventory:
+    """Conditional when the source is already loaded, raises ValueError for
+    inventories bigger than `budget` bytes"""
+    info = _info.get(page) if page in rtfm_cache else None
+    headers = {}
+    if info is not None and info.etag:
+        headers["If-None-Match"] = info.etag
+    if info is not None and info.last_modified:
+        headers["If-Modified-Since"] = info.last_modified
+
+    async with session.get(
+        page + "/objects.inv", headers=headers, timeout=TIMEOUT
+    ) as resp:
+        if resp.status == 304 and info is not None:
+            info.fetched_at = time.time()
+            await _save(page, info, rtfm_cache[page])
+            _failed.pop(page, None)
+            LOGGER.info("%s inventory is up to date", page)
+            return rtfm_cache[page]
+
+        resp.raise_for_status()
+        data = await _read(resp)
+        info = CacheInfo(
+            time.time(), resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+        )
 
-async def do_rtfm(ctx: commands.Context, key: tuple, obj: str = None):
+    # Parsing and indexing big inventories takes a while, keep it off the loop
+    inventory = await asyncio.to_thread(
+        parse_object_inv, SphinxObjectFileReader(data), page
+    )
+    index, size = await asyncio.to_thread(_index, inventory)
+    _check_size(page, size, budget)
+    _swap(page, inventory, index, size, info)
+    _failed.pop(page, None)
+    LOGGER.info("Fetched %d objects from %s", len(inventory), page)
+    await _save(page, info, inventory)
+    return inventory
+
+
+async def load_inventory(
+    session: aiohttp.ClientSession, page: str, budget: Optional[int] = None
+) -> Inventory:
+    """From disk if cached there, even stale, otherwise from the network"""
+    cached = await asyncio.to_thread(_read_cache, page)
+    if cached is None:
+        return await fetch_inventory(session, page, budget)
+
+    info, inventory = cached
+    index, size = await asyncio.to_thread(_index, inventory)
+    _check_size(page, size, budget)
+    _swap(page, inventory, index, size, info)
+    LOGGER.info("Loaded %d objects for %s from disk", len(inventory), page)
+    if is_stale(page):
+        # Once this load is done, _start would skip a page still in flight
+        asyncio.current_task().add_done_callback(
+            lambda _: refresh(session, page, budget)
+        )
+    return inventory
+
+
+def is_stale(page: str) -> bool:
+    # Sources without a fetch time were put in rtfm_cache directly
+    info = _info.get(page)
+    return info is not None and time.time() - info.fetched_at > TTL
+
+
+def _done(page: str, task: asyncio.Task) -> None:
+    if _fetching.get(page) is task:
+        _fetching.pop(page)
+    if not task.cancelled() and task.exception() is not None:
+        _failed[page] = time.monotonic()
+        LOGGER.warning("Failed to fetch %s inventory", page, exc_info=task.exception())
+
+
+def _start(page: str, coro: Coroutine[Any, Any, Inventory]) -> Optional[asyncio.Task]:
+    """Runs `coro` unless that source is in flight or failed recently"""
+    if page in _fetching:
+        coro.close()
+        return _fetching[page]
+    if time.monotonic() - _failed.get(page, -RETRY_AFTER) < RETRY_AFTER:
+        coro.close()
+        return None
+
+    task = asyncio.create_task(coro, name=f"rtfm-{page}")
+    task.add_done_callback(lambda t: _done(page, t))
+    _fetching[page] = task
+    return task
+
+
+def refresh(
+    session: aiohttp.ClientSession, page: str, budget: Optional[int] = None
+) -> None:
+    """Revalidates a loaded source in the background"""
+    _start(page, fetch_inventory(session, page, budget))
+
+
+def load(
+    session: aiohttp.ClientSession, page: str, budget: Optional[int] = None
+) -> Optional[asyncio.Task]:
+    """Loads a missing source, joining a load in flight. None when it failed
+    recently"""
+    return _start(page, load_inventory(session, page, budget))
+
+
+async def get_inventory(
+    session: aiohttp.ClientSession, page: str, budget: Optional[int] = None
+) -> Inventory:
+    """Raises RuntimeError when the source is unavailable"""
+    if page in rtfm_cache:
+        return rtfm_cache[page]
+
+    task = load(session, page, budget)
+    if task is None:
+        raise RuntimeError(f"Could not fetch {page}, retrying later")
+
+    try:
+        # Shielded, one caller giving up does not cancel it for the others
+        return await asyncio.shield(task)
+    except Exception as e:
+        # The same for every failure, the cause is logged. Sources are added by
+        # guild admins, it must not tell them what answers on the bot's network
+        raise RuntimeError(f"Could not fetch {page}") from e
+
+
+def is_public(host: str) -> bool:
+    """Whether an IP address is on the internet, raises ValueError for names"""
+    address = ipaddress.ip_address(host)
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    # Not global covers private, loopback, link-local and reserved ranges
+    return address.is_global and not address.is_multicast
+
+
+class PublicResolver(aiohttp.ThreadedResolver):
+    """Only resolves names to addresses on the internet"""
+
+    async def resolve(
+        self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET
+    ) -> List[aiohttp.abc.ResolveResult]:
+        hosts = await super().resolve(host, port, family)
+        hosts = [h for h in hosts if is_public(h["host"])]
+        if not hosts:
+            raise OSError(f"{host} has no public address")
+        return hosts
+
+
+def _check_url(url: yarl.URL) -> None:
+    # Addresses in the url skip the resolver
+    try:
+        public = is_public(url.raw_host or "")
+    except ValueError:
+        return
+    if not public:
+        raise aiohttp.InvalidURL(url)
+
+
+async def _on_request_start(
+    session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+) -> None:
+    _check_url(params.url)
+
+
+async def _on_request_redirect(
+    session: aiohttp.ClientSession, ctx: SimpleNamespace, params: Any
+) -> None:
+    location = params.response.headers.get("Location")
+    if location is not None:
+        _check_url(params.url.join(yarl.URL(location)))
+
+
+def public_session() -> aiohttp.ClientSession:
+    """A session that never connects to private, loopback or link-local hosts,
+    for sources guild admins add. Every redirect and refresh is checked"""
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(_on_request_start)
+    trace.on_request_redirect.append(_on_request_redirect)
+    connector = aiohttp.TCPConnector(resolver=PublicResolver())
+    return aiohttp.ClientSession(connector=connector, trace_configs=[trace])
+
+
+async def get_index(page: str) -> search.SearchIndex:
+    """The index of a loaded source, built for inventories put in rtfm_cache
+    directly"""
+    inventory = rtfm_cache[page]
+    _used[page] = time.monotonic()
+    index = _indexes.get(page)
+    if index is None or index.inventory is not inventory:
+        index, size = await asyncio.to_thread(_index, inventory)
+        if rtfm_cache.get(page) is inventory:
+            _swap(page, inventory, index, size, None)
+    return index
+
+
+def evict(page: str) -> None:
+    """Unloads a source, it loads again from the disk cache when queried"""
+    for cache in (rtfm_cache, _indexes, _sizes, _used, _info):
+        cache.pop(page, None)
+    _forget(page)
+
+
+def trim(budget: int, keep: str = None) -> List[str]:
+    """Evicts the least recently queried sources until the loaded ones hold
+    at most `budget` bytes, never `keep` nor sources being fetched"""
+    used = sum(_sizes.get(page, 0) for page in rtfm_cache)
+    evicted = []
+    for page in sorted(rtfm_cache, key=lambda p: _used.get(p, 0.0)):
+        if used <= budget:
+            break
+        if page == keep or page in _fetching:
+            continue
+        used -= _sizes.get(page, 0)
+        evict(page)
+        evicted.append(page)
+    if evicted:
+        LOGGER.info("Evicted %s over the rtfm memory budget", ", ".join(evicted))
+    return evicted
+
+
+class Source(NamedTuple):
+    name: str
+    page: str
+    guild_id: Optional[int] = None  # None when built in, GLOBAL for every guild
+
+    @property
+    def title(self) -> str:
+        return "Discord.py" if self.name == "stable" else self.name.capitalize()
+
+    @property
+    def scope(self) -> str:
+        if self.guild_id is None:
+            return "built in"
+        return "global" if self.guild_id == GLOBAL else "server"
+
+    @property
+    def trusted(self) -> bool:
+        """Built in or added by owners, it may be on a private network"""
+        return self.guild_id is None or self.guild_id == GLOBAL
+
+
+class Sources:
+    """Documentation sources by name: built in, added by owners for every
+    guild and added by a guild's admins, the most specific winning.
+
+    Inventories load when first queried. Past `budget_mb` the least recently
+    queried are evicted, they reload from the disk cache when needed again.
+
+    Sources added by guild admins are only fetched from public hosts."""
+
+    def __init__(self, bot: "AceBot", budget_mb: float = 64) -> None:
+        self.bot = bot
+        self.budget = int(budget_mb * 1024**2)
+        self.public_session = public_session()
+
+    async def close(self) -> None:
+        await self.public_session.close()
+
+    def _session(self, source: Source) -> aiohttp.ClientSession:
+        return self.bot.session if source.trusted else self.public_session
+
+    async def available(self, guild_id: Optional[int]) -> Dict[str, Source]:
+        sources = {name: Source(name, page) for name, page in RTFM_PAGES.items()}
+        for scope in (GLOBAL, guild_id) if guild_id else (GLOBAL,):
+            for key, page in (await self.bot.guild_config.fetch(scope)).items():
+                if key.startswith(PREFIX):
+                    name = key[len(PREFIX) :]
+                    sources[name] = Source(name, page, scope)
+        return sources
+
+    async def resolve(self, guild_id: Optional[int], name: str) -> Optional[Source]:
+        name = name.casefold()
+        sources = await self.available(guild_id)
+        return sources.get(name) or sources.get(ALIASES.get(name))
+
+    async def add(self, guild_id: int, name: str, page: str) -> Source:
+        """Checks the site serves an inventory before storing it, raises
+        ValueError for bad names or urls and RuntimeError for bad sites"""
+        name = name.casefold()
+        if not NAME.fullmatch(name):
+            raise ValueError("Names are up to 32 letters, digits, - or _")
+        if name in RTFM_PAGES or name in ALIASES:
+            raise ValueError(f"{name} is a built in source")
+
+        page = page.strip().removesuffix("objects.inv").rstrip("/")
+        if not page.startswith(("https://", "http://")):
+            raise ValueError("Sources are http(s) urls of Sphinx documentation")
+
+        source = Source(name, page, guild_id)
+        await self.load(source)
+        await self.bot.guild_config.set(guild_id, PREFIX + name, page)
+        await self._changed(guild_id)
+        return source
+
+    async def remove(self, guild_id: int, name: str) -> bool:
+        key = PREFIX + name.casefold()
+        if key not in await self.bot.guild_config.fetch(guild_id):
+            return False
+        await self.bot.guild_config.set(guild_id, key, None)
+        await self._changed(guild_id)
+        return True
+
+    async def _changed(self, guild_id: int) -> None:
+        # Other clusters cache global sources too, they reload them on next use
+        if guild_id == GLOBAL and self.bot.cluster is not None:
+            await self.bot.cluster.broadcast("evict_config", guild_id=GLOBAL)
+
+    async def load(self, source: Source) -> Inventory:
+        """Raises RuntimeError when the source is unavailable"""
+        page = source.page
+        loaded = page in rtfm_cache
+        inventory = await get_inventory(self._session(source), page, self.budget)
+        if not loaded:
+            trim(self.budget, keep=page)
+        return inventory
+
+    def prefetch(self, source: Source) -> None:
+        """Starts loading a source without waiting for it"""
+        page = source.page
+        task = load(self._session(source), page, self.budget)
+        if task is not None:
+            task.add_done_callback(lambda _: trim(self.budget, keep=page))
+
+    def refresh(self, source: Source) -> None:
+        """Revalidates a loaded source in the background"""
+        refresh(self._session(source), source.page, self.budget)
+
+    def size(self, page: str) -> Optional[int]:
+        """Bytes held by a loaded source, None when it is not loaded"""
+        return _sizes.get(page) if page in rtfm_cache else None
+
+    @property
+    def used(self) -> int:
+        return sum(_sizes.get(page, 0) for page in rtfm_cache)
+
+
+async def complete(page: str, current: str, limit: int = 25) -> List[str]:
+    """Names of a loaded source best matching a partial query, memoized per
+    query so every keystroke is searched once"""
+    query = NAMESPACE.sub(r"\1", current.strip())
+    index = await get_index(page)
+    cached = _completions.get((page, query))
+    if cached is not None and cached[0] is index:
+        _completions.move_to_end((page, query))
+        return cached[1]
+
+    names = [name for name, _ in index.search(query, limit=limit)]
+    _completions[page, query] = (index, names)
+    if len(_completions) > COMPLETIONS:
+        _completions.popitem(last=False)
+    return names
+
+
+class SourceConverter(commands.Converter):
+    async def convert(self, ctx: commands.Context, argument: str) -> Source:
+        """A source available in the guild, by name or alias"""
+        source = await ctx.bot.rtfm.resolve(ctx.guild and ctx.guild.id, argument)
+        if source is None:
+            raise commands.BadArgument(f"No documentation source called {argument}")
+        return source
+
+
+async def do_rtfm(ctx: commands.Context, source: Source, obj: str = None):
+    page = source.page
     if obj is None:
-        return await ctx.reply(RTFM_PAGES[key], mention_author=False)
+        return await ctx.reply(page, mention_author=False)
 
     # If no cache
-    if not rtfm_cache:
+    if page not in rtfm_cache:
         await ctx.typing()
-        await build_rtfm_table()
+        try:
+            await ctx.bot.rtfm.load(source)
+        except RuntimeError as e:
+            return await ctx.reply(str(e), mention_author=False, delete_after=5)
+    elif is_stale(page):
+        # Answered from the current data while it revalidates
+        ctx.bot.rtfm.refresh(source)
 
     # Discard any discord.ext.commands
-    obj = re.sub(r"^(?:discord\.(?:ext\.)?)?(?:commands\.)?(.+)", r"\1", obj)
-
-    cache: List[Tuple[str, Dict[str, str]]] = list(rtfm_cache[key].items())
-
-    # Sort and get the top 8 items
-    t = time.time()
-    _type = None
-    if ":" in obj:
-        _type, obj = obj.split(":", maxsplit=1)
-
-    matches = sorted(
-        cache,
-        key=lambda c: avg(
-            [
-                difflib.SequenceMatcher(None, m[0].casefold(), m[1].casefold()).ratio()
-                for m in zip(reversed(obj.split(".")), c[0].split())
-            ]
-        )
-        + (5 * c[1]["type"].startswith(_type.casefold()) if _type else 0),
-        reverse=True,
-    )[:8]
-    t = time.time() - t
+    obj = NAMESPACE.sub(r"\1", obj)
+
+    index = await get_index(page)
+
+    # The top 8 items
+    t = time.perf_counter()
+    matches = index.search(obj, limit=8)
+    t = time.perf_counter() - t
 
     embed = discord.Embed(
-        title=f"RTFM - {'Discord.py' if key == ('stable') else key[0].capitalize()}",
+        title=f"RTFM - {source.title}",
         colour=discord.Colour.blurple(),
     )
     embed.set_footer(
-        text=f"Query time : {t:,.2f}s",
-        icon_url=ctx.author.avatar.url,
+        text=f"Query time : {t * 1000:,.2f}ms",
+        icon_url=ctx.author.display_avatar.url,
     )
     if len(matches) == 0:
         return await ctx.reply(
@@ -177,8 +730,9 @@ async def do_rtfm(ctx: commands.Context, key: tuple, obj: str = None):
 
     # Format results
     results = []
-    for key, data in matches:
-        results.append(f"[`{data['type'][:4]}`] [`{key}`]({data['url']})")
+    for key, entry in matches:
+        url = index.inventory.url(entry)
+        results.append(f"[`{entry.type[:4]}`] [`{key}`]({url})")
 
     embed.description = "\n".join(results)
     await ctx.reply(embed=embed, mention_author=False)
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import logging
+import pathlib
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+LOGGER = logging.getLogger("discord.ace.runtimes")
+
+PISTON_RUNTIMES = "https://emkc.org/api/v2/piston/runtimes"
+CACHE = pathlib.Path(__file__).parent.parent / ".cache" / "runtimes.json"
+
+
+class Runtimes:
+    """Piston runtimes, loaded after startup and cached on disk for `ttl` seconds"""
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        path: pathlib.Path = CACHE,
+        ttl: float = 24 * 3600,
+    ) -> None:
+        self.session = session
+        self.path = path
+        self.ttl = ttl
+
+        self.runtimes: List[Dict[str, Any]] = []
+        self.aliases: Dict[str, Dict[str, Any]] = {}  # alias/language -> runtime
+        self.languages: Dict[str, Dict[str, Any]] = {}  # language -> runtime
+        self.fetched_at: float = 0.0
+
+    def __contains__(self, alias: str) -> bool:
+        return alias.casefold() in self.aliases
+
+    def get(self, alias: str) -> Optional[Dict[str, Any]]:
+        return self.aliases.get(alias.casefold())
+
+    def _build(self, runtimes: List[Dict[str, Any]]) -> None:
+        aliases, languages = {}, {}
+        for r in runtimes:
+            # First runtime listed wins, like the old linear scan
+            languages.setdefault(r["language"], r)
+            aliases.setdefault(r["language"], r)
+            for alias in r["aliases"]:
+                aliases.setdefault(alias, r)
+
+        self.runtimes, self.aliases, self.languages = runtimes, aliases, languages
+
+    def _read_cache(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as file:
+            json.dump({"fetched_at": self.fetched_at, "runtimes": self.runtimes}, file)
+
+    async def load(self) -> None:
+        cached = await asyncio.to_thread(self._read_cache)
+        if cached:
+            self.fetched_at = cached["fetched_at"]
+            self._build(cached["runtimes"])
+            if time.time() - self.fetched_at < self.ttl:
+                LOGGER.info("Loaded %d runtimes from cache", len(self.runtimes))
+                return
+
+        try:
+            await self.refresh()
+        except Exception:
+            LOGGER.warning(
+                "Failed to fetch runtimes, %s",
+                "using stale cache" if self.runtimes else "eval is unavailable",
+                exc_info=1,
+            )
+
+    async def refresh(self) -> None:
+        async with self.session.get(
+            PISTON_RUNTIMES, timeout=aiohttp.ClientTimeout(total=10)
+        ) as resp:
+            resp.raise_for_status()
+            runtimes = await resp.json()
+
+        self.fetched_at = time.time()
+        self._build(runtimes)
+        await asyncio.to_thread(self._write_cache)
+        LOGGER.info("Fetched %d runtimes", len(self.runtimes))
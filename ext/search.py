@@ -0,0 +1,363 @@
+import collections
+import difflib
+import heapq
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from utils.misc import avg
+
+if TYPE_CHECKING:
+    from ext.rtfm import Entry
+
+# Type masks kept per index
+CACHED = 16
+
+
+def score(segments: Sequence[str], name: str, type: str, _type: Optional[str]) -> float:
+    """How rtfm ranks `name` for a query split on dots, casefolded and reversed.
+
+    The last query segment is compared with the first word of the name, the
+    one before with the second word and so on. Entries of the requested type
+    get +5, which puts them above every other one."""
+    return avg(
+        [
+            difflib.SequenceMatcher(None, segment, word.casefold()).ratio()
+            for segment, word in zip(segments, name.split())
+        ]
+    ) + (5 * type.startswith(_type) if _type else 0)
+
+
+def split_query(obj: str) -> Tuple[List[str], Optional[str]]:
+    """Query segments in comparison order and the requested type, if any"""
+    _type = None
+    if ":" in obj:
+        _type, obj = obj.split(":", maxsplit=1)
+        _type = _type.casefold()
+    return [segment.casefold() for segment in reversed(obj.split("."))], _type
+
+
+def linear_search(
+    inventory: Mapping[str, "Entry"], obj: str, limit: int = 8
+) -> List[Tuple[str, "Entry"]]:
+    """Scores every entry, the reference `SearchIndex.search` reproduces"""
+    segments, _type = split_query(obj)
+    return sorted(
+        inventory.items(),
+        key=lambda c: score(segments, c[0], c[1].type, _type),
+        reverse=True,
+    )[:limit]
+
+
+def _bits(mask: int) -> Iterator[int]:
+    """Positions of the set bits of `mask`, lowest first"""
+    digits = bin(mask)[:1:-1]
+    i = digits.find("1")
+    while i != -1:
+        yield i
+        i = digits.find("1", i + 1)
+
+
+def _mask(bits: Iterable[int], size: int) -> int:
+    """An int with the given bits set, all below `size`"""
+    mask = bytearray(size // 8 + 1)
+    for bit in bits:
+        mask[bit >> 3] |= 1 << (bit & 7)
+    return int.from_bytes(mask, "little")
+
+
+def _pattern(segment: str) -> Dict[str, int]:
+    """Where each character occurs in `segment`, for `_common`"""
+    pattern: Dict[str, int] = {}
+    for i, char in enumerate(segment):
+        pattern[char] = pattern.get(char, 0) | 1 << i
+    return pattern
+
+
+def _common(pattern: Dict[str, int], length: int, word: str) -> int:
+    """Length of the longest common subsequence of a segment of `length`
+    and `word`, bit parallel over the segment's `_pattern`"""
+    full = (1 << length) - 1
+    v = full
+    for char in word:
+        u = v & pattern.get(char, 0)
+        v = ((v + u) | (v - u)) & full
+    return length - v.bit_count()
+
+
+class SearchIndex:
+    """Finds the entries `linear_search` ranks first without scoring them all.
+
+    Every distinct word gets a signature: for each character, as many bits
+    as it occurs. The popcount of two signatures ANDed together bounds the
+    characters a SequenceMatcher can match, so `2 * popcount / total length`
+    bounds its ratio. The blocks it matches are also a common subsequence,
+    a tighter bound computed for the entries that get close.
+
+    Single word names, most of an inventory, are stored bit sliced: a column
+    per signature bit with a bit per entry, and a mask per word length, so
+    how many bits every one of them shares with a query takes a few big int
+    operations. Names of several words are bounded from per word tables.
+    Entries are visited best bound first and scored until the best remaining
+    bound falls under the k-th score."""
+
+    def __init__(self, inventory: Mapping[str, "Entry"]) -> None:
+        self.inventory = inventory
+        self.items = list(inventory.items())
+        self.types: List[str] = [entry.type for _, entry in self.items]
+
+        vocabulary: Dict[str, int] = {}
+        self.words: List[Tuple[int, ...]] = [
+            tuple(
+                vocabulary.setdefault(word.casefold(), len(vocabulary))
+                for word in name.split()
+            )
+            for name, _ in self.items
+        ]
+        self.vocabulary: List[str] = list(vocabulary)
+        self.lengths: List[int] = [len(word) for word in self.vocabulary]
+
+        # Character -> (offset, width) in the signatures
+        self.layout: Dict[str, Tuple[int, int]] = {}
+        offset = 0
+        widths: Dict[str, int] = {}
+        for word in self.vocabulary:
+            for char, count in collections.Counter(word).items():
+                if count > widths.get(char, 0):
+                    widths[char] = count
+        for char, width in widths.items():
+            self.layout[char] = (offset, width)
+            offset += width
+        self.signatures: List[int] = [self.signature(w) for w in self.vocabulary]
+
+        size = len(self.items)
+        self.all = (1 << size) - 1
+
+        # Single words: signature bit -> entries, and length -> entries
+        columns: List[List[int]] = [[] for _ in range(offset)]
+        lengths: Dict[int, List[int]] = {}
+        # Several words: word count -> entries, and their words by position
+        phrases: Dict[int, Tuple[List[int], List[List[int]]]] = {}
+        for i, words in enumerate(self.words):
+            if len(words) == 1:
+                lengths.setdefault(self.lengths[words[0]], []).append(i)
+                for bit in _bits(self.signatures[words[0]]):
+                    columns[bit].append(i)
+            elif words:
+                if len(words) not in phrases:
+                    phrases[len(words)] = ([], [[] for _ in words])
+                indices, positions = phrases[len(words)]
+                indices.append(i)
+                for position, w in zip(positions, words):
+                    position.append(w)
+
+        self.columns: Dict[int, int] = {
+            bit: _mask(entries, size) for bit, entries in enumerate(columns) if entries
+        }
+        self.buckets: Dict[int, int] = {
+            length: _mask(entries, size) for length, entries in lengths.items()
+        }
+        self.phrases = phrases
+        # Word position -> distinct words there
+        self.positions: List[List[int]] = [
+            sorted(
+                {w for _, words in phrases.values() if p < len(words) for w in words[p]}
+            )
+            for p in range(max(phrases, default=0))
+        ]
+
+        self._types: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def signature(self, word: str) -> int:
+        bits = 0
+        for char, count in collections.Counter(word).items():
+            if char in self.layout:
+                offset, width = self.layout[char]
+                bits |= ((1 << min(count, width)) - 1) << offset
+        return bits
+
+    def typed(self, _type: str) -> int:
+        """Entries whose type starts with `_type`"""
+        mask = self._types.get(_type)
+        if mask is None:
+            if len(self._types) >= CACHED:
+                self._types.clear()
+            mask = self._types[_type] = _mask(
+                (i for i, type in enumerate(self.types) if type.startswith(_type)),
+                len(self.items),
+            )
+        return mask
+
+    def count(self, query: int) -> List[int]:
+        """How many signature bits every single word entry shares with
+        `query`, as a bit sliced counter, least significant plane first"""
+        planes: List[int] = []
+        for bit in _bits(query):
+            carry = self.columns.get(bit, 0)
+            for k, plane in enumerate(planes):
+                if not carry:
+                    break
+                planes[k], carry = plane ^ carry, plane & carry
+            if carry:
+                planes.append(carry)
+        return planes
+
+    def equal(self, planes: List[int], count: int) -> int:
+        """Entries sharing exactly `count` bits"""
+        if count >> len(planes):
+            return 0
+        mask = self.all
+        for k, plane in enumerate(planes):
+            mask &= plane if count >> k & 1 else ~plane
+        return mask
+
+    def search(self, obj: str, limit: int = 8) -> List[Tuple[str, "Entry"]]:
+        """The same entries, in the same order, as `linear_search`"""
+        segments, _type = split_query(obj)
+        if not _type:
+            found = self._search(segments, limit, self.all)
+        else:
+            # Matching entries are 5 points ahead, the rest only fill the gaps
+            typed = self.typed(_type)
+            found = self._search(segments, limit, typed, bonus=5)
+            if len(found) < limit:
+                found += self._search(segments, limit - len(found), self.all ^ typed)
+        return [self.items[i] for i in found]
+
+    def _search(
+        self, segments: List[str], limit: int, among: int, bonus: int = 0
+    ) -> List[int]:
+        if limit <= 0 or not among:
+            return []
+
+        queries = [self.signature(s) for s in segments]
+        patterns = [_pattern(s) for s in segments]
+        # (segment, word) -> longest common subsequence, then ratio
+        common: Dict[Tuple[int, int], int] = {}
+        ratios: Dict[Tuple[int, int], float] = {}
+
+        def exact(i: int) -> float:
+            values = []
+            for s, w in enumerate(self.words[i][: len(segments)]):
+                ratio = ratios.get((s, w))
+                if ratio is None:
+                    segment, word = segments[s], self.vocabulary[w]
+                    total = len(segment) + len(word)
+                    if not common[s, w]:
+                        ratio = 0.0
+                    elif len(word) < 200 and (segment in word or word in segment):
+                        # Found whole by the first find_longest_match
+                        ratio = 2.0 * min(len(segment), len(word)) / total
+                    else:
+                        ratio = difflib.SequenceMatcher(None, segment, word).ratio()
+                    ratios[s, w] = ratio
+                values.append(ratio)
+            return avg(values) + bonus
+
+        def bound(i: int) -> float:
+            bounds = []
+            for s, w in enumerate(self.words[i][: len(segments)]):
+                matches = common.get((s, w))
+                if matches is None:
+                    matches = common[s, w] = _common(
+                        patterns[s], len(segments[s]), self.vocabulary[w]
+                    )
+                bounds.append(2.0 * matches / (len(segments[s]) + self.lengths[w]))
+            return avg(bounds) + bonus
+
+        # Scored entries, keeping the k-th best score as the threshold
+        scores: Dict[int, float] = {}
+        best: List[float] = []
+
+        def add(i: int) -> None:
+            value = scores[i] = exact(i)
+            if len(best) < limit:
+                heapq.heappush(best, value)
+            elif value > best[0]:
+                heapq.heapreplace(best, value)
+
+        # A max heap of
+        #   (bound, 0, entry): bounded by common subsequences, scored next
+        #   (bound, 1, entry): bounded by signatures, then by subsequences
+        #   (bound, 2, length, count): the single words of a length sharing
+        #     `count` signature bits with the first segment, then one less
+        #   (bound, 3): the names of several words
+        # Words are never empty so the total length is never 0
+        length = len(segments[0])
+        planes = self.count(queries[0])
+        heap: List[Tuple] = []
+        for size, mask in self.buckets.items():
+            if mask & among:
+                count = min(length, size)
+                heap.append((-(2.0 * count / (length + size) + bonus), 2, size, count))
+
+        # Names of several words, bounded from a table per position, wait
+        # behind their best bound to be pushed once the threshold has risen
+        tables = [
+            {
+                w: 2.0
+                * (query & self.signatures[w]).bit_count()
+                / (len(segment) + self.lengths[w])
+                for w in words
+            }
+            for segment, query, words in zip(segments, queries, self.positions)
+        ]
+        allowed = None if among == self.all else bin(among)[:1:-1]
+        values: List[float] = []
+        phrases: List[int] = []
+        for words, (indices, positions) in self.phrases.items():
+            pairs = min(words, len(segments))
+            sums = [0.0] * len(indices)
+            for table, position in zip(tables[:pairs], positions):
+                # Summed in word order, like `avg`
+                sums = [a + table[w] for a, w in zip(sums, position)]
+            values.extend([a / pairs + bonus for a in sums])
+            phrases.extend(indices)
+        if phrases:
+            heap.append((-max(values), 3))
+        heapq.heapify(heap)
+
+        if heap and -heap[0][0] <= bonus:
+            # Nothing shares a character with the query, everything ties
+            return [i for i in _bits(among) if self.words[i]][:limit]
+
+        while heap:
+            value = -heap[0][0]
+            if len(best) >= limit and value < best[0]:
+                break
+            item = heapq.heappop(heap)
+            if item[1] == 0:
+                add(item[2])
+            elif item[1] == 1:
+                heapq.heappush(heap, (-bound(item[2]), 0, item[2]))
+            elif item[1] == 3:
+                threshold = best[0] if len(best) >= limit else float("-inf")
+                for estimate, i in zip(values, phrases):
+                    if estimate < threshold:
+                        continue
+                    if allowed is None or (i < len(allowed) and allowed[i] == "1"):
+                        heapq.heappush(heap, (-estimate, 1, i))
+            else:
+                _, _, size, count = item
+                if count > 0:
+                    value = 2.0 * (count - 1) / (length + size) + bonus
+                    heapq.heappush(heap, (-value, 2, size, count - 1))
+                mask = self.equal(planes, count) & self.buckets[size] & among
+                for i in _bits(mask):
+                    heapq.heappush(heap, (-bound(i), 0, i))
+
+        kth = best[0] if len(best) >= limit else float("-inf")
+        found = sorted((-value, i) for i, value in scores.items() if value >= kth)
+        # Ties keep inventory order, like the stable sort they replace
+        return [i for _, i in found[:limit]]
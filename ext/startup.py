@@ -0,0 +1,100 @@
+import contextvars
+import importlib.abc
+import importlib.machinery
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+
+@dataclass
+class ExtensionTiming:
+    name: str
+    imported: float = 0.0  # Module execution, dependencies included
+    setup: float = 0.0  # setup() minus cog_load
+    cog_load: float = 0.0
+    total: float = 0.0
+    error: Optional[str] = None
+
+
+# Extension currently loading in this task, used to attribute cog_load
+current: contextvars.ContextVar[Optional[ExtensionTiming]] = contextvars.ContextVar(
+    "current_extension", default=None
+)
+
+
+class _TimedLoader:
+    def __init__(self, loader: Any, timing: ExtensionTiming) -> None:
+        self.loader = loader
+        self.timing = timing
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        timer = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.timing.imported += time.perf_counter() - timer
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.loader, name)
+
+
+class _TimedFinder(importlib.abc.MetaPathFinder):
+    """Wraps the loader of extensions being timed, other imports pass through"""
+
+    def __init__(self) -> None:
+        self.timings: Dict[str, ExtensionTiming] = {}
+
+    def find_spec(self, fullname, path, target=None):
+        timing = self.timings.get(fullname)
+        if timing is None:
+            return None
+
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+        if spec is not None and spec.loader is not None:
+            spec.loader = _TimedLoader(spec.loader, timing)
+        return spec
+
+
+finder = _TimedFinder()
+sys.meta_path.insert(0, finder)
+
+
+def load_order(
+    extensions: Sequence[str], dependencies: Dict[str, Iterable[str]]
+) -> List[List[str]]:
+    """Groups extensions into batches, each one only depends on earlier batches"""
+    pending = {ext: set(dependencies.get(ext, ())) & set(extensions) for ext in extensions}
+    batches: List[List[str]] = []
+    while pending:
+        batch = [ext for ext, deps in pending.items() if not deps]
+        if not batch:
+            raise RuntimeError(f"Circular extension dependencies: {', '.join(pending)}")
+
+        batches.append(batch)
+        for ext in batch:
+            del pending[ext]
+        for deps in pending.values():
+            deps.difference_update(batch)
+    return batches
+
+
+async def timed(coro, timing: ExtensionTiming) -> None:
+    """Runs an extension load, filling in `timing`"""
+    token = current.set(timing)
+    finder.timings[timing.name] = timing
+    timer = time.perf_counter()
+    try:
+        await coro
+    except Exception as e:
+        timing.error = f"{type(e.__cause__ or e).__qualname__}: {e.__cause__ or e}"
+        raise
+    finally:
+        timing.total = time.perf_counter() - timer
+        timing.setup = max(timing.total - timing.imported - timing.cog_load, 0.0)
+        del finder.timings[timing.name]
+        current.reset(token)
+
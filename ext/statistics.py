@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from main import AceBot
+
+LOGGER = logging.getLogger("discord.ace.statistics")
+
+
+class Statistics:
+    """Write-behind buffer for the statistics table.
+
+    Increments are merged in memory per (id, key) and written in a single
+    transaction every `flush_interval` seconds or once `flush_threshold`
+    increments are pending, whichever comes first."""
+
+    def __init__(
+        self,
+        bot: "AceBot",
+        flush_interval: float = 30.0,
+        flush_threshold: int = 500,
+    ) -> None:
+        self.bot = bot
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+
+        self._pending: Dict[Tuple[int, str], int] = {}
+        self._increments: int = 0
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Lifetime counters
+        self.flushes: int = 0
+        self.written: int = 0
+
+    @property
+    def pending(self) -> int:
+        """Amount of increments not yet written to the database"""
+        return self._increments
+
+    def increment(self, id: int, key: str, value: int = 1) -> None:
+        self._pending[(id, key)] = self._pending.get((id, key), 0) + value
+        self._increments += 1
+
+        if self._increments >= self.flush_threshold:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="statistics-flush")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception:
+                LOGGER.error("Failed to flush statistics", exc_info=1)
+
+    async def flush(self) -> int:
+        """Writes every pending increment, returns the amount of rows upserted"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+
+            pending, increments = self._pending, self._increments
+            self._pending, self._increments = {}, 0
+
+            try:
+                async with self.bot.pool.acquire() as conn:
+                    async with conn.transaction():
+                        await conn.executemany(
+                            "INSERT INTO statistics (id, key, value) VALUES (?, ?, ?) ON CONFLICT(id, key) DO UPDATE SET value = value + excluded.value;",
+                            [(id, key, value) for (id, key), value in pending.items()],
+                        )
+            except Exception:
+                # Merge back so nothing is lost, newer increments included
+                for k, value in pending.items():
+                    self._pending[k] = self._pending.get(k, 0) + value
+                self._increments += increments
+                raise
+
+            self.flushes += 1
+            self.written += increments
+            LOGGER.debug(
+                "Flushed %d increments into %d rows", increments, len(pending)
+            )
+            return len(pending)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self.flush()
@@ -0,0 +1,141 @@
+import asyncio
+import contextlib
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterator, List, Optional
+
+LOGGER = logging.getLogger("discord.ace.watchdog")
+
+
+@dataclass
+class Stall:
+    at: float  # Unix time the stall was detected
+    task: str  # asyncio task running when captured
+    label: Optional[str]  # Command or listener, when known
+    stack: str
+    duration: float = 0.0  # Filled in once the loop catches up
+
+
+class Watchdog:
+    """Measures event loop scheduling lag and captures stalls.
+
+    A task on the loop sleeps `interval` seconds and records how late it
+    woke up. A helper thread watches its heartbeat, when it is older than
+    `threshold` it grabs the loop thread's stack while it is still blocked."""
+
+    def __init__(
+        self,
+        interval: float = 0.25,
+        threshold: float = 0.5,
+        samples: int = 14400,  # An hour at the default interval
+        reports: int = 20,
+    ) -> None:
+        self.interval = interval
+        self.threshold = threshold
+
+        self.lags: Deque[float] = deque(maxlen=samples)
+        self.stalls: Deque[Stall] = deque(maxlen=reports)
+
+        self._labels: Dict[asyncio.Task, str] = {}
+        self._heartbeat: float = time.monotonic()
+        self._stalled: Optional[Stall] = None
+        self._loop: asyncio.AbstractEventLoop
+        self._loop_thread: int = 0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @contextlib.contextmanager
+    def attribute(self, label: str) -> Iterator[None]:
+        """Labels the current task so stalls can be attributed to it"""
+        task = asyncio.current_task()
+        if task is None:
+            yield
+            return
+
+        previous = self._labels.get(task)
+        self._labels[task] = label
+        try:
+            yield
+        finally:
+            if previous is None:
+                self._labels.pop(task, None)
+            else:
+                self._labels[task] = previous
+
+    def percentile(self, p: float) -> float:
+        """Lag percentile in seconds over the retained samples"""
+        if not self.lags:
+            return 0.0
+        lags = sorted(self.lags)
+        return lags[min(int(p / 100 * len(lags)), len(lags) - 1)]
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+
+        self._task = asyncio.create_task(self._measure(), name="watchdog")
+        self._thread = threading.Thread(
+            target=self._watch, name="watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _measure(self) -> None:
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - before - self.interval, 0.0)
+
+            self._heartbeat = now
+            self.lags.append(lag)
+
+            stall, self._stalled = self._stalled, None
+            if stall is not None:
+                stall.duration = lag
+                LOGGER.warning(
+                    "Event loop blocked for %.0fms in %s (%s)\n%s",
+                    lag * 1000,
+                    stall.label or "unknown",
+                    stall.task,
+                    stall.stack,
+                )
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval / 2):
+            if self._stalled is not None:
+                continue  # Already captured this one
+
+            blocked = time.monotonic() - self._heartbeat - self.interval
+            if blocked < self.threshold:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+
+            task = asyncio.current_task(self._loop)
+            stall = Stall(
+                at=time.time(),
+                task=task.get_name() if task else "no task",
+                label=self._labels.get(task) if task else None,
+                stack="".join(traceback.format_stack(frame)),
+            )
+            self._stalled = stall
+            self.stalls.append(stall)
+
+    def recent(self, amount: int = 5) -> List[Stall]:
+        return list(self.stalls)[-amount:]
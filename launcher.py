@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+from multiprocessing.connection import Connection, wait
+from typing import Any, Dict, List
+
+from ext.cluster import Cluster, register_handlers, shard_ranges
+
+LOGGER = logging.getLogger("discord.ace.launcher")
+
+parser = argparse.ArgumentParser(description="Runs AceBot over multiple processes")
+parser.add_argument('token', nargs="?", help="The bot token")
+parser.add_argument('-c', '--clusters', type=int, default=2, help="Amount of worker processes")
+parser.add_argument('-s', '--shard-count', type=int, help="Total amount of shards, defaults to one per cluster")
+parser.add_argument('--fake', action="store_true", help="Run against a fake gateway, no token needed")
+
+
+class FakeBot:
+    """Stand-in for AceBot, enough for the cluster handlers"""
+
+    def __init__(self, shard_ids: List[int]) -> None:
+        self.shard_ids = shard_ids
+        self.guilds = [object() for _ in range(100 * len(shard_ids))]
+        self.users = [object() for _ in range(2500 * len(shard_ids))]
+        self.latency = 0.042
+        self.extensions: Dict[str, Any] = {"cogs.fake": None}
+
+    async def reload_extension(self, name: str) -> None:
+        await asyncio.sleep(0)
+
+
+async def run_fake(cluster: Cluster) -> None:
+    register_handlers(cluster, FakeBot(cluster.shard_ids))  # type: ignore
+    stopped = asyncio.Event()
+
+    @cluster.handler("shutdown")
+    async def shutdown() -> None:
+        asyncio.get_running_loop().call_later(0.1, stopped.set)
+
+    async def disconnect():
+        stopped.set()
+
+    cluster.on_disconnect = disconnect
+    cluster.start()
+
+    # First cluster checks every cross-cluster command end to end
+    if cluster.id == 0:
+        await asyncio.sleep(0.5)
+        for command in ("stats", "reload"):
+            replies = await cluster.broadcast(command, timeout=5)
+            print(f"[{command}] {len(replies)}/{cluster.clusters} clusters replied")
+            for reply in replies:
+                print(f"  #{reply['cluster']}: {reply['error'] or reply['data']}")
+        await cluster.broadcast("shutdown", timeout=5)
+        return
+
+    await stopped.wait()
+
+
+def run_cluster(
+    token: str,
+    id: int,
+    clusters: int,
+    shard_ids: List[int],
+    shard_count: int,
+    conn: Connection,
+    fake: bool,
+) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The launcher handles it
+    cluster = Cluster(id, clusters, shard_ids, conn)
+
+    if fake:
+        return asyncio.run(run_fake(cluster))
+
+    import main
+
+    bot = main.create_bot(shard_count=shard_count, shard_ids=shard_ids, cluster=cluster)
+    bot.run(token)
+
+
+def send(conn: Connection, message: Dict[str, Any]) -> None:
+    try:
+        conn.send(message)
+    except (BrokenPipeError, OSError):
+        pass  # Cluster exited, its EOF gets handled by route
+
+
+def route(conns: List[Connection]) -> None:
+    """Relays broadcasts to every cluster and replies back to their origin"""
+    alive = list(conns)
+    while alive:
+        for conn in wait(alive):
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                alive.remove(conn)
+                continue
+
+            match message["op"]:
+                case "broadcast":
+                    message["op"] = "command"
+                    for other in alive:
+                        send(other, message)
+                case "reply":
+                    origin = conns[message["origin"]]
+                    if origin in alive:
+                        send(origin, message)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parser.parse_args()
+    if not (args.token or args.fake):
+        parser.error("A token is required unless running with --fake")
+    shard_count = args.shard_count or args.clusters
+    if shard_count < args.clusters:
+        parser.error("Cannot have more clusters than shards")
+
+    if not args.fake:
+        # Once for every cluster, they would race each other otherwise
+        import main as bot
+
+        version = asyncio.run(bot.migrate(bot.load_config()))
+        LOGGER.info("Database schema at version %d", version)
+
+    processes: List[multiprocessing.Process] = []
+    conns: List[Connection] = []
+    for id, shard_ids in enumerate(shard_ranges(shard_count, args.clusters)):
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=run_cluster,
+            args=(args.token, id, args.clusters, shard_ids, shard_count, child, args.fake),
+            name=f"cluster-{id}",
+        )
+        process.start()
+        child.close()
+
+        LOGGER.info("Started cluster %d with shards %s", id, shard_ids)
+        processes.append(process)
+        conns.append(parent)
+
+    try:
+        route(conns)
+    except KeyboardInterrupt:
+        LOGGER.info("Shutting down clusters")
+    finally:
+        for conn in conns:
+            conn.close()
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+
+if __name__ == "__main__":
+    main()
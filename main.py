@@ -1,17 +1,36 @@
 import argparse
+import asyncio
+import contextlib
 import json
 import logging
-import logging.handlers
+import pathlib
 import time
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, Optional
 
 import aiohttp
 import asqlite
 import discord
 from discord.ext import commands
 
-from cogs import EXTENSIONS
-from ext import info
+from cogs import DEPENDENCIES, EXTENSIONS
+from ext import (
+    cluster,
+    database,
+    gateway,
+    guildconfig,
+    info,
+    latency,
+    queries,
+    ratelimits,
+    recorder,
+    resources,
+    rtfm,
+    runtimes,
+    startup,
+    statistics,
+    watchdog,
+)
+from utils import logs, subclasses
 from utils.dynamic import QuitButton
 
 if TYPE_CHECKING:
@@ -21,17 +40,43 @@ LOGGER = logging.getLogger("discord")
 LOGGER.setLevel(logging.INFO)
 logging.getLogger("discord.http").setLevel(logging.INFO)
 
-handler = logging.handlers.RotatingFileHandler(
-    filename="discord.log", encoding="utf-8", maxBytes=32 * 1024**2, backupCount=5
-)
-formatter = logging.Formatter(
-    "[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{"
-)
-handler.setFormatter(formatter)
-LOGGER.addHandler(handler)
-
 parser = argparse.ArgumentParser()
 parser.add_argument('token', help="The bot token")
+parser.add_argument('--sharded', action="store_true", help="Run with AutoShardedBot")
+parser.add_argument('--shard-count', type=int, help="Total amount of shards")
+parser.add_argument('--shard-ids', type=int, nargs="+", help="Shards to run in this process")
+
+
+def load_config() -> dict[str, Any]:
+    with open("config.json", "r") as cfg:
+        return json.load(cfg)
+
+
+def per_cluster(path: str, cluster_id: Optional[int]) -> str:
+    """`path` with the cluster id before its extensions, clusters never share
+    a file"""
+    if cluster_id is None:
+        return path
+    path = pathlib.Path(path)
+    stem, dot, suffixes = path.name.partition(".")
+    return str(path.with_name(f"{stem}-{cluster_id}{dot}{suffixes}"))
+
+
+def create_pool(db_config: dict[str, Any], size: int) -> asqlite.PoolContextManager:
+    return asqlite.create_pool(
+        db_config.get("path", "database.db"),
+        size=size,
+        init=database.apply_pragmas(
+            database.pragma_profile(db_config.get("pragmas"))
+        ),
+    )
+
+
+async def migrate(config: dict[str, Any]) -> int:
+    """Upgrades the database once, for launchers starting several bots on it"""
+    async with create_pool(config.get("database", {}), size=1) as pool:
+        return await database.migrate(pool)
+
 
 def prefix(bot: "AceBot", msg: discord.abc.Messageable):
     p: str = bot.config["prefix"]
@@ -39,97 +84,301 @@ def prefix(bot: "AceBot", msg: discord.abc.Messageable):
 
 
 class AceBot(commands.Bot):
-    def __init__(self, intents: discord.Intents, owner_id: int, **kwargs):
+    def __init__(
+        self,
+        intents: discord.Intents,
+        owner_id: int,
+        cluster: Optional[cluster.Cluster] = None,
+        **kwargs,
+    ):
+        self.config: dict[str, Any] = load_config()
+        cluster_id = cluster.id if cluster is not None else None
+
+        # Opt-in, raw payloads are only dispatched with debug events enabled
+        recording = self.config.get("recorder")
+        if recording:
+            path = recording.get("path", "gateway.jsonl.gz")
+            recording = recording | {"path": per_cluster(path, cluster_id)}
+        self.recorder = recorder.Recorder(**recording) if recording else None
+
+        # REST telemetry, traced on discord.py's own session
+        self.http_stats = ratelimits.HTTPStats()
         super().__init__(
             command_prefix=prefix,
             intents=intents,
             owner_id=owner_id,
             help_command=None,
+            http_trace=self.http_stats.trace_config(),
+            enable_debug_events=self.recorder is not None,
             **kwargs,
         )
-        with open("config.json", "r") as cfg:
-            self.config: dict[str, Any] = json.load(cfg)
+        self.http.request = self.http_stats.wrap(self.http.request)
+
+        # File logging happens on a background thread
+        logging_config = self.config.get("logging", {})
+        file = per_cluster(logging_config.get("file", "discord.log"), cluster_id)
+        self.logs = logs.LogPipeline(**logging_config | {"file": file})
+        self.logs.start(LOGGER)
 
-        self.pool: asqlite.Pool
+        # Shutdown steps, registered as what they stop is created. Unwound last
+        # to first by close, every step runs even if an earlier one raised
+        self._shutdown = contextlib.AsyncExitStack()
+        self._shutdown.callback(self.logs.stop)
+
+        self.pool: queries.InstrumentedPool
         self.session: aiohttp.ClientSession
 
         self.boot = time.time()
         self.logger = LOGGER
         self.games: dict[str, "game.Game"] = {}
+        self.cluster = cluster
+
+        # Per-command latency histograms
+        self.latency_stats = latency.CommandLatency()
+        self.before_invoke(self.mark_before_invoke)
+        self.after_invoke(self.mark_after_invoke)
+
+        # Gateway event rates and listener timings
+        self.gateway_stats = gateway.GatewayStats()
+
+        # Extension load timings
+        self.startup: dict[str, startup.ExtensionTiming] = {}
+        self.startup_time: float = 0.0
 
     async def setup_hook(self):
+        if self.recorder is not None:
+            self.recorder.start()
+            self._shutdown.callback(self.recorder.stop)
+
+        # Event loop lag
+        self.watchdog = watchdog.Watchdog(**self.config.get("watchdog", {}))
+        self.watchdog.start()
+        self._shutdown.callback(self.watchdog.stop)
+
+        # CPU, memory and friends over time
+        self.resources = resources.ResourceSampler(
+            self.watchdog, **self.config.get("resources", {})
+        )
+        self.resources.start()
+        self._shutdown.callback(self.resources.stop)
+
         # Database stuff
-        self.pool = await asqlite.create_pool("database.db")
+        db_config: dict[str, Any] = self.config.get("database", {})
+        pool = await create_pool(db_config, db_config.get("pool_size", database.POOL_SIZE))
+        # Every statement is timed, slow ones are logged with their plan
+        self.queries = queries.Queries(**db_config.get("queries", {}))
+        self.pool = self.queries.wrap(pool)
+        self._shutdown.push_async_callback(self.pool.close)
         LOGGER.info("Created connection to database")
 
-        async with self.pool.acquire() as conn:
-            tables = {
-                "economy": "CREATE TABLE economy ( id INTEGER NOT NULL, money INTEGER DEFAULT (0));",
-                "guildConfig": "CREATE TABLE guildConfig ( id INTEGER DEFAULT (0), key TEXT NOT NULL, value BLOB, PRIMARY KEY(id, key));",
-                "statistics": "CREATE TABLE statistics (id INTEGER DEFAULT (0), key TEXT NOT NULL, value INTEGER DEFAULT (0), PRIMARY KEY(id, key));",
-            }
-            existing_tables = [
-                name[0]
-                for name in await conn.fetchall(
-                    "SELECT name FROM sqlite_master WHERE type = 'table';"
-                )
-            ]
-            for table, schema in tables.items():
-                if table not in existing_tables:
-                    LOGGER.info(
-                        "%s table missing from database, creating one..." % table
-                    )
-                    await conn.execute(schema)
+        # Clustered, the launcher migrated it before starting any cluster
+        if self.cluster is None:
+            version = await database.migrate(self.pool)
+            LOGGER.info("Database schema at version %d", version)
 
-            await conn.commit()
+        self.guild_config = guildconfig.GuildConfig(
+            self, **self.config.get("guild_config", {})
+        )
 
         # Module stuff
-        for extension in EXTENSIONS:
-            try:
-                await self.load_extension(extension)
-                LOGGER.info("%s loaded", extension)
+        await self.load_extensions(EXTENSIONS)
 
-            except Exception as e:
-                LOGGER.error("%s failed to load", extension, exc_info=1)
+        # Cross-cluster commands
+        if self.cluster is not None:
+            cluster.register_handlers(self.cluster, self)
+            self.cluster.on_disconnect = self.close
+            self.cluster.start()
 
         # Dynamic items
         self.add_dynamic_items(QuitButton)
 
         # HTTP stuff
         self.session = aiohttp.ClientSession()
+        self._shutdown.push_async_callback(self.session.close)
+
+        # Documentation sources, loaded when first queried
+        self.rtfm = rtfm.Sources(self, **self.config.get("rtfm", {}))
+        self._shutdown.push_async_callback(self.rtfm.close)
+
+        # Piston runtimes, loaded in the background
+        self.runtimes = runtimes.Runtimes(
+            self.session, **self.config.get("runtimes", {})
+        )
+        self._runtimes_task = asyncio.create_task(self.runtimes.load())
+        self._shutdown.callback(self._runtimes_task.cancel)
 
         # Bot info
         self.info = info.Info(self)
 
+        # Statistics write-behind buffer
+        self.statistics = statistics.Statistics(
+            self, **self.config.get("statistics", {})
+        )
+        self.statistics.start()
+        # Unwound after the gateway, commands finishing while it closes are counted
+        self._shutdown.push_async_callback(self.statistics.close)
+
+    async def load_extensions(self, extensions: list[str]):
+        """Loads extensions concurrently, respecting `cogs.DEPENDENCIES`"""
+        timer = time.perf_counter()
+        failed: set[str] = set()
+        for batch in startup.load_order(extensions, DEPENDENCIES):
+            loads = {}
+            for extension in batch:
+                timing = self.startup[extension] = startup.ExtensionTiming(extension)
+                missing = failed.intersection(DEPENDENCIES.get(extension, []))
+                if missing:
+                    timing.error = f"Dependency failed: {', '.join(missing)}"
+                    failed.add(extension)
+                    LOGGER.error("%s not loaded, %s", extension, timing.error)
+                    continue
+
+                loads[extension] = startup.timed(self.load_extension(extension), timing)
+
+            results = await asyncio.gather(*loads.values(), return_exceptions=True)
+            for extension, result in zip(loads, results):
+                timing = self.startup[extension]
+                if isinstance(result, Exception):
+                    failed.add(extension)
+                    LOGGER.error("%s failed to load", extension, exc_info=result)
+                else:
+                    LOGGER.info(
+                        "%s loaded in %.0fms (import %.0fms, setup %.0fms, cog_load %.0fms)",
+                        extension,
+                        timing.total * 1000,
+                        timing.imported * 1000,
+                        timing.setup * 1000,
+                        timing.cog_load * 1000,
+                    )
+
+        self.startup_time = time.perf_counter() - timer
+        LOGGER.info(
+            "Loaded %d/%d extensions in %.0fms",
+            len(extensions) - len(failed),
+            len(extensions),
+            self.startup_time * 1000,
+        )
+
+    async def add_cog(self, cog: commands.Cog, /, **kwargs):
+        # Attribute cog_load to the extension being loaded, if any
+        timing = startup.current.get()
+        timer = time.perf_counter()
+        try:
+            await super().add_cog(cog, **kwargs)
+        finally:
+            if timing is not None:
+                timing.cog_load += time.perf_counter() - timer
+
     async def close(self):
-        await self.session.close()
-        await self.pool.close()
-        await super().close()
+        # Only what setup_hook got to before failing is stopped
+        async with self._shutdown:
+            await super().close()
+
+    def dispatch(self, event_name: str, /, *args: Any, **kwargs: Any) -> None:
+        # Counted here rather than in a listener to avoid a task per event
+        if event_name == "socket_event_type":
+            self.gateway_stats.event(args[0])
+        elif event_name == "socket_raw_receive":
+            if self.recorder is not None:
+                self.recorder.record(args[0])
+        super().dispatch(event_name, *args, **kwargs)
+
+    async def _run_event(self, coro, event_name: str, *args: Any, **kwargs: Any):
+        start = time.perf_counter()
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            self.gateway_stats.listener(event_name, time.perf_counter() - start)
 
     async def on_ready(self):
         LOGGER.info("Connected as %s (ID: %d)", self.user, self.user.id)
 
+    async def on_shard_ready(self, shard_id: int):
+        LOGGER.info("Shard %d ready", shard_id)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.guild_config.evict(guild.id)
+
+    async def get_context(self, origin, /, *, cls=subclasses.Context):
+        start = time.perf_counter()
+        ctx = await super().get_context(origin, cls=cls)
+        if isinstance(ctx, subclasses.Context):
+            ctx.timings["start"] = start
+            subclasses.mark(ctx, "parsed")
+        return ctx
+
+    async def invoke(self, ctx: commands.Context, /):
+        subclasses.mark(ctx, "invoke")
+        label = f"command {ctx.command.qualified_name}" if ctx.command else "command"
+        token = ratelimits.source.set(label)
+        try:
+            with self.watchdog.attribute(label):
+                await super().invoke(ctx)
+        finally:
+            ratelimits.source.reset(token)
+
+    async def mark_before_invoke(self, ctx: commands.Context):
+        subclasses.mark(ctx, "before_invoke")
+
+    async def mark_after_invoke(self, ctx: commands.Context):
+        subclasses.mark(ctx, "after_invoke")
+
+    async def record_latency(self, ctx: commands.Context):
+        subclasses.mark(ctx, "completed")
+        if isinstance(ctx, subclasses.Context):
+            self.latency_stats.record(ctx)
+
     async def log_commands_run(self, ctx: commands.Context):
         assert ctx.command is not None
-        async with self.pool.acquire() as conn:
-            # +1 command ran
-            await conn.execute(
-                "INSERT INTO statistics (id, key, value) VALUES (?, ?, 1) ON CONFLICT(id, key) DO UPDATE SET value = value + 1;",
-                (
-                    ctx.guild.id if ctx.guild else 0,
-                    "CMD_RAN:" + ctx.command.qualified_name,
-                ),
-            )
-            await conn.commit()
+        # +1 command ran, written on the next flush
+        self.statistics.increment(
+            ctx.guild.id if ctx.guild else 0, "CMD_RAN:" + ctx.command.qualified_name
+        )
 
 
-if __name__ == "__main__":
+class ShardedAceBot(AceBot, commands.AutoShardedBot):
+    pass
+
+
+def create_bot(
+    sharded: bool = False,
+    shard_count: Optional[int] = None,
+    shard_ids: Optional[list[int]] = None,
+    **kwargs,
+) -> AceBot:
     intents = discord.Intents.default()
     intents.message_content = True
     intents.members = True
-    args = parser.parse_args()
 
-    bot = AceBot(intents=intents, owner_id=493107597281329185)
+    if sharded or shard_count:
+        bot = ShardedAceBot(
+            intents=intents,
+            owner_id=493107597281329185,
+            shard_count=shard_count,
+            shard_ids=shard_ids,
+            **kwargs,
+        )
+    else:
+        bot = AceBot(intents=intents, owner_id=493107597281329185, **kwargs)
+
     bot.add_listener(bot.log_commands_run, "on_command_completion")
+    bot.add_listener(bot.record_latency, "on_command_completion")
+    return bot
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    # Sharding, the command line takes precedence over config.json
+    sharding: dict[str, Any] = load_config().get("sharding", {})
+    shard_count = args.shard_count or sharding.get("shard_count")
+    shard_ids = args.shard_ids or sharding.get("shard_ids")
+    if shard_ids and not shard_count:
+        parser.error("--shard-ids requires a shard count")
 
+    bot = create_bot(
+        sharded=args.sharded or sharding.get("enabled", False),
+        shard_count=shard_count,
+        shard_ids=shard_ids,
+    )
     bot.run(args.token)
@@ -0,0 +1,148 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from typing import Any, Dict, Optional
+
+FORMAT = "[{asctime}] [{levelname:<8}] {name}: {message}"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "time": time.strftime(DATE_FORMAT, time.localtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps 1 in `rate` records per logger, warnings and above always pass"""
+
+    def __init__(self, rates: Dict[str, int]) -> None:
+        super().__init__()
+        self.rates = rates
+        self.seen: Dict[str, int] = {}
+        self.sampled: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.name)
+        if not rate or rate <= 1 or record.levelno >= logging.WARNING:
+            return True
+
+        seen = self.seen.get(record.name, 0)
+        self.seen[record.name] = seen + 1
+        if seen % rate == 0:
+            return True
+
+        self.sampled[record.name] = self.sampled.get(record.name, 0) + 1
+        return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, queue: queue.Queue) -> None:
+        super().__init__(queue)
+        self.dropped: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records stay in process, formatting happens on the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    # Seconds the sentinel may wait for room while the thread drains the queue
+    SENTINEL_TIMEOUT = 10.0
+
+    def enqueue_sentinel(self) -> None:
+        # Blocks, put_nowait would fail whenever the queue is full
+        self.queue.put(self._sentinel, timeout=self.SENTINEL_TIMEOUT)
+
+
+class LogPipeline:
+    """Routes a logger through a bounded queue to a rotating file,
+    written by a background thread so the event loop never blocks on disk"""
+
+    def __init__(
+        self,
+        file: str = "discord.log",
+        max_bytes: int = 32 * 1024**2,
+        backup_count: int = 5,
+        json_format: bool = False,
+        queue_size: int = 10_000,
+        sampling: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        handler = logging.handlers.RotatingFileHandler(
+            filename=file, encoding="utf-8", maxBytes=max_bytes, backupCount=backup_count
+        )
+        handler.setFormatter(
+            JSONFormatter()
+            if json_format
+            else logging.Formatter(FORMAT, DATE_FORMAT, style="{")
+        )
+
+        self.handler = _QueueHandler(self.queue)
+        self.sampler = SamplingFilter(sampling or {})
+        self.handler.addFilter(self.sampler)
+        self.listener = _QueueListener(
+            self.queue, handler, respect_handler_level=True
+        )
+        self.logger: Optional[logging.Logger] = None
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    @property
+    def capacity(self) -> int:
+        return self.queue.maxsize
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped
+
+    @property
+    def running(self) -> bool:
+        return self.logger is not None
+
+    def start(self, logger: logging.Logger) -> None:
+        if self.running:
+            return
+        self.logger = logger
+        logger.addHandler(self.handler)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        # Drains what is left in the queue
+        if not self.running:
+            return
+        # Nothing is queued behind the sentinel, it would never be written
+        self.logger.removeHandler(self.handler)
+        self.logger = None
+        atexit.unregister(self.stop)
+        try:
+            self.listener.stop()
+        except queue.Full:
+            # The listener is stuck, logging is what would report it
+            print(
+                f"Log listener did not drain {self.depth} records, they are lost",
+                file=sys.stderr,
+            )
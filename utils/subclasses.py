@@ -68,6 +68,27 @@ async def can_use(ctx: commands.Context):
     return True
 
 
+class Context(commands.Context):
+    """Context carrying per-phase timestamps for the latency histograms"""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.timings: Dict[str, float] = {}
+        self.reply_time: float = 0.0
+
+    async def send(self, *args, **kwargs) -> Message:
+        timer = time.perf_counter()
+        try:
+            return await super().send(*args, **kwargs)
+        finally:
+            self.reply_time += time.perf_counter() - timer
+
+
+def mark(ctx: commands.Context, phase: str) -> None:
+    if isinstance(ctx, Context):
+        ctx.timings[phase] = time.perf_counter()
+
+
 @dataclass
 class Setting:
     annotation: Any
@@ -81,24 +102,19 @@ class Cog(commands.Cog):
         self.time: float = time.time()
         self.config: Dict[str, Setting] = {"disabled": Setting(bool, False)}
 
-    async def get_setting(
-        self, ctx: commands.Context, module: str, setting: str
-    ) -> Optional[str]:
-        assert ctx.guild is not None
-        async with self.bot.pool.acquire() as conn:
-            setting = await conn.fetchone(
-                "SELECT value FROM guildConfig WHERE id = ? AND key LIKE '?:?';",
-                (ctx.guild.id, module.casefold(), setting.upper()),
-            )
-            return setting[0] if setting else None
+    async def get_setting(self, guild_id: int, setting: str) -> Optional[Any]:
+        return await self.bot.guild_config.get(
+            guild_id, f"{self.qualified_name}:{setting}", self.config[setting].default
+        )
 
     async def cog_before_invoke(self, ctx: commands.Context) -> None:
+        mark(ctx, "cog_before_invoke")
         if ctx.guild is None:
             return await super().cog_before_invoke(ctx)
 
         try:
             if await commands.run_converters(
-                ctx, bool, await self.get_setting(ctx, "disabled"), commands.Parameter
+                ctx, bool, await self.get_setting(ctx.guild.id, "disabled"), commands.Parameter
             ):
                 raise errors.ModuleDisabled(self)
         except: